@@ -22,10 +22,10 @@ import sys
 sys.path.append('../')
 
 import numpy as np
-import copy
 import pandas as pd
 from scipy.signal import find_peaks
 from matplotlib import pyplot as plt
+from functools import cached_property
 
 from utilsKinematics import kinematics
 
@@ -135,6 +135,16 @@ class gait_analysis(kinematics):
         
         return self.gaitEvents
     
+    # Cached leg selection; fixed once the gait cycles are segmented, so
+    # the metric methods skip the repeated string branching.
+    @cached_property
+    def _leg(self):
+        return self.get_leg()
+    
+    @cached_property
+    def _leg_lower(self):
+        return self.get_leg(lower=True)
+    
     def rotate_x_forward(self):
         # Find the midpoint of the PSIS markers
         psis_midpoint = (self.markerDict['markers']['r.PSIS_study'] + self.markerDict['markers']['L.PSIS_study']) / 2
@@ -229,7 +239,7 @@ class gait_analysis(kinematics):
     
     def compute_stride_length(self,return_all=False):
         
-        leg,_ = self.get_leg()
+        leg,_ = self._leg
         
         calc_position = self.markerDictRotatedPerGaitCycle['markers'][leg + '_calc_study']
 
@@ -253,7 +263,7 @@ class gait_analysis(kinematics):
         
     
     def compute_step_length(self,return_all=False):
-        leg, contLeg = self.get_leg()
+        leg, contLeg = self._leg
         step_lengths = {}
         
         step_lengths[contLeg.lower()] = (
@@ -339,7 +349,7 @@ class gait_analysis(kinematics):
         
         # Heuristic to determine if overground or treadmill.
         if gait_style == 'auto' or gait_style == 'treadmill':
-            leg,_ = self.get_leg()
+            leg,_ = self._leg
             
             foot_position = self.markerDict['markers'][leg + '_ankle_study']
             
@@ -374,9 +384,19 @@ class gait_analysis(kinematics):
         else:
             return treadmillSpeed, units
     
+    @staticmethod
+    def _interval_means(positions, starts, ends):
+        # Per-interval means of positions[starts[i]:ends[i]] in one C-level
+        # pass: interleave the bounds and let add.reduceat sum each window.
+        idx = np.empty(2 * len(starts), dtype=np.intp)
+        idx[0::2] = starts
+        idx[1::2] = ends
+        sums = np.add.reduceat(positions, idx, axis=0)[0::2]
+        return sums / (ends - starts)[:, np.newaxis]
+
     def compute_step_width(self,return_all=False):
         
-        leg,contLeg = self.get_leg()
+        leg,contLeg = self._leg
         
         # Get ankle joint center positions.
         ankle_position_ips = (
@@ -386,25 +406,28 @@ class gait_analysis(kinematics):
             self.markerDict['markers'][contLeg + '_ankle_study'] + 
             self.markerDict['markers'][contLeg + '_mankle_study'])/2        
         
+        # Hoist the event-index columns; the comprehensions below index
+        # them per cycle.
+        ipsIdx = self.gaitEvents['ipsilateralIdx']
+        contIdx = self.gaitEvents['contralateralIdx']
+        
         # Find indices of 40-60% of the stance phase
-        ips_stance_length = np.diff(self.gaitEvents['ipsilateralIdx'][:,(0,1)])
-        cont_stance_length = (self.gaitEvents['contralateralIdx'][:,0] - 
-                              self.gaitEvents['ipsilateralIdx'][:,0] +
-                              self.gaitEvents['ipsilateralIdx'][:,2]-
-                              self.gaitEvents['contralateralIdx'][:,1])
+        ips_stance_length = np.diff(ipsIdx[:,(0,1)])
+        cont_stance_length = (contIdx[:,0] - ipsIdx[:,0] +
+                              ipsIdx[:,2] - contIdx[:,1])
         
-        midstanceIdx_ips = [range(self.gaitEvents['ipsilateralIdx'][i,0] + 
+        midstanceIdx_ips = [range(ipsIdx[i,0] + 
                                   int(np.round(.4*ips_stance_length[i])),
-                                  self.gaitEvents['ipsilateralIdx'][i,0] + 
+                                  ipsIdx[i,0] + 
                                   int(np.round(.6*ips_stance_length[i]))) 
                                   for i in range(self.nGaitCycles)]
         
-        midstanceIdx_cont = [range(np.min((self.gaitEvents['contralateralIdx'][i,1] + 
+        midstanceIdx_cont = [range(np.min((contIdx[i,1] + 
                                   int(np.round(.4*cont_stance_length[i])),
-                                  self.gaitEvents['ipsilateralIdx'][i,2]-1)),
-                                  np.min((self.gaitEvents['contralateralIdx'][i,1] + 
+                                  ipsIdx[i,2]-1)),
+                                  np.min((contIdx[i,1] + 
                                   int(np.round(.6*cont_stance_length[i])),
-                                  self.gaitEvents['ipsilateralIdx'][i,2]))) 
+                                  ipsIdx[i,2]))) 
                                   for i in range(self.nGaitCycles)]   
         
         ankleVector = np.zeros((self.nGaitCycles,3))
@@ -503,7 +526,7 @@ class gait_analysis(kinematics):
         hs_2_idx = self.gaitEvents['ipsilateralIdx'][:,2]
         
         # ankle markers
-        leg,contLeg = self.get_leg()
+        leg,contLeg = self._leg
         ankleVector = (self.markerDict['markers'][leg + '_ankle_study'] - 
                        self.markerDict['markers'][contLeg + '_ankle_study'])
         ankleVector_inGaitFrame = np.array(
@@ -538,7 +561,7 @@ class gait_analysis(kinematics):
         hs_2_idx = self.gaitEvents['ipsilateralIdx'][:,2]
         
         # ankle markers
-        leg,contLeg = self.get_leg()
+        leg,contLeg = self._leg
         ankleVector = (self.markerDict['markers'][leg + '_ankle_study'] - 
                        self.markerDict['markers'][contLeg + '_ankle_study'])
         ankleVector_inGaitFrame = np.array(
@@ -611,17 +634,20 @@ class gait_analysis(kinematics):
         # the weighting is based on mean absolute percent error. In effect,
         # this penalizes both shape and magnitude differences.
         
-        leg,contLeg = self.get_leg(lower=True)
+        leg,contLeg = self._leg_lower
                
         correlations_all_cycles = []
         mean_correlation_all_cycles = np.zeros((self.nGaitCycles,1))
         
+        ipsIdx = self.gaitEvents['ipsilateralIdx']
+        contIdx = self.gaitEvents['contralateralIdx']
+        
         for i in range(self.nGaitCycles):
 
             
-            hs_ind_1 = self.gaitEvents['ipsilateralIdx'][i,0]
-            hs_ind_cont = self.gaitEvents['contralateralIdx'][i,1]
-            hs_ind_2 = self.gaitEvents['ipsilateralIdx'][i,2]
+            hs_ind_1 = ipsIdx[i,0]
+            hs_ind_cont = contIdx[i,1]
+            hs_ind_2 = ipsIdx[i,2]
             
             df1 = pd.DataFrame()
             df2 = pd.DataFrame()
@@ -687,8 +713,13 @@ class gait_analysis(kinematics):
             
         if not return_all:
             mean_correlation_all_cycles = np.mean(mean_correlation_all_cycles)
-            correlations_all_cycles =  {key: sum(d[key] for d in correlations_all_cycles) / 
-                                        len(correlations_all_cycles) for key in correlations_all_cycles[0]}
+            # Average per-key across cycles with one vectorized reduction
+            # instead of a Python sum per key.
+            keys = list(correlations_all_cycles[0])
+            values = np.array([[d[key] for key in keys]
+                               for d in correlations_all_cycles])
+            correlations_all_cycles = dict(
+                zip(keys, values.mean(axis=0).tolist()))
             
         return correlations_all_cycles, mean_correlation_all_cycles
 
@@ -697,38 +728,36 @@ class gait_analysis(kinematics):
         # Create frame for each gait cycle with x: pelvis heading, 
         # z: average vector between ASIS during gait cycle, y: cross.
         
+        markers = self.markerDict['markers']
+        
         # Pelvis center trajectory (for overground heading vector).
         pelvisMarkerNames = ['r.ASIS_study','L.ASIS_study','r.PSIS_study','L.PSIS_study']
-        pelvisMarkers = [self.markerDict['markers'][mkr]  for mkr in pelvisMarkerNames]
-        pelvisCenter = np.mean(np.array(pelvisMarkers),axis=0)
+        pelvisCenter = np.stack(
+            [markers[mkr] for mkr in pelvisMarkerNames]).mean(axis=0)
         
         # Ankle trajectory (for treadmill heading vector).
         leg = self.gaitEvents['ipsilateralLeg']
         if leg == 'l': leg='L'
-        anklePos = self.markerDict['markers'][leg + '_ankle_study']
+        anklePos = markers[leg + '_ankle_study']
         
         # Vector from left ASIS to right ASIS (for mediolateral direction).
-        asisMarkerNames = ['L.ASIS_study','r.ASIS_study']
-        asisMarkers = [self.markerDict['markers'][mkr]  for mkr in asisMarkerNames]
-        asisVector = np.squeeze(np.diff(np.array(asisMarkers),axis=0))
+        asisVector = markers['r.ASIS_study'] - markers['L.ASIS_study']
         
         # Heading vector per gait cycle.
         # If overground, use pelvis center trajectory; treadmill: ankle trajectory.
         if self.treadmillSpeed == 0:
-            x = np.diff(pelvisCenter[self.gaitEvents['ipsilateralIdx'][:,(0,2)],:],axis=1)[:,0,:]
+            x = (pelvisCenter[self.gaitEvents['ipsilateralIdx'][:,2]] - 
+                 pelvisCenter[self.gaitEvents['ipsilateralIdx'][:,0]])
             x = x / np.linalg.norm(x,axis=1,keepdims=True)
         else: 
-            x = np.zeros((self.nGaitCycles,3))
-            for i in range(self.nGaitCycles):
-                x[i,:] = anklePos[self.gaitEvents['ipsilateralIdx'][i,2]] - \
-                         anklePos[self.gaitEvents['ipsilateralIdx'][i,1]]
+            x = (anklePos[self.gaitEvents['ipsilateralIdx'][:,2]] - 
+                 anklePos[self.gaitEvents['ipsilateralIdx'][:,1]])
             x = x / np.linalg.norm(x,axis=1,keepdims=True)
             
-        # Mean ASIS vector over gait cycle.
-        z_temp = np.zeros((self.nGaitCycles,3))
-        for i in range(self.nGaitCycles):
-            z_temp[i,:] = np.mean(asisVector[self.gaitEvents['ipsilateralIdx'][i,0]: \
-                             self.gaitEvents['ipsilateralIdx'][i,2]],axis=0)
+        # Mean ASIS vector over gait cycle, all cycles in one pass.
+        z_temp = self._interval_means(asisVector,
+                                      self.gaitEvents['ipsilateralIdx'][:,0],
+                                      self.gaitEvents['ipsilateralIdx'][:,2])
         z_temp = z_temp / np.linalg.norm(z_temp,axis=1,keepdims=True)
         
         # Cross to get y.
@@ -736,8 +765,14 @@ class gait_analysis(kinematics):
         
         z = np.cross(x,y)
         
-        # 3x3xnSteps.
-        R_lab_to_gait = np.stack((x.T,y.T,z.T),axis=1).transpose((2, 0, 1))
+        # nStepsx3x3. Assign the basis vectors straight into the columns of
+        # one contiguous buffer instead of stacking transposed views and
+        # re-transposing; consumers left-multiply row vectors (v @ R), so
+        # x/y/z must sit in the columns as in the original construction.
+        R_lab_to_gait = np.empty((self.nGaitCycles,3,3))
+        R_lab_to_gait[:,:,0] = x
+        R_lab_to_gait[:,:,1] = y
+        R_lab_to_gait[:,:,2] = z
         
         return R_lab_to_gait
     
@@ -749,24 +784,39 @@ class gait_analysis(kinematics):
         # by subsequent gait cycles (since it is the same index as the first heel strike in the subsequent
         # gait cycle). We assume that the gait frame doesn't change dramatically from step to step.
 
-        def rotate_vec(vec,R):
-            return np.dot(vec,R)
+        # Hoist the rotation tensor out of the loops; the accessor is lazy
+        # but still pays a call and cache check per use.
+        R_all = self.R_world_to_gait()
+        ipsIdx = self.gaitEvents['ipsilateralIdx']
+        
+        # Expand to one rotation matrix per in-cycle frame. A single
+        # einsum per array then rotates every frame of every cycle in one
+        # contraction, replacing the per-(marker, cycle) np.dot calls. The
+        # cycle ranges are disjoint, so the gather/scatter order does not
+        # matter.
+        frame_idx = np.concatenate(
+            [np.arange(start, stop)
+             for start, stop in zip(ipsIdx[:,0], ipsIdx[:,2])])
+        R_per_frame = np.repeat(R_all, ipsIdx[:,2] - ipsIdx[:,0], axis=0)
+        
+        def rotate_frames(vec):
+            return np.einsum('fj,fjk->fk', vec[frame_idx], R_per_frame)
         
         if vectorArray is None: # rotate each marker in the entire markerDict
-            markerDict_rotated_per_step = copy.deepcopy(self.markerDict)
-            for marker_name,marker in markerDict_rotated_per_step['markers'].items():
-                for i in range(self.nGaitCycles):
-                    markerDict_rotated_per_step['markers'][marker_name][self.gaitEvents['ipsilateralIdx'][i,0]:
-                                                                        self.gaitEvents['ipsilateralIdx'][i,2],:] = rotate_vec(
-                    marker[self.gaitEvents['ipsilateralIdx'][i,0]:self.gaitEvents['ipsilateralIdx'][i,2],:],
-                    self.R_world_to_gait()[i,:,:])
+            # Shallow-copy the dict and copy only the marker arrays that
+            # get rotated in place below; deepcopy walked the whole
+            # object graph to do the same work.
+            markerDict_rotated_per_step = dict(self.markerDict)
+            markerDict_rotated_per_step['markers'] = {
+                name: marker.copy()
+                for name, marker in self.markerDict['markers'].items()}
+            for marker_name,marker in self.markerDict['markers'].items():
+                markerDict_rotated_per_step['markers'][marker_name][
+                    frame_idx,:] = rotate_frames(marker)
             return markerDict_rotated_per_step
             
         else:
-            for i in range(self.nGaitCycles):
-                vectorArray[self.gaitEvents['ipsilateralIdx'][i,0]:self.gaitEvents['ipsilateralIdx'][i,2],:] = rotate_vec(
-                    vectorArray[self.gaitEvents['ipsilateralIdx'][i,0]:self.gaitEvents['ipsilateralIdx'][i,2],:],
-                        self.R_world_to_gait()[i,:,:])
+            vectorArray[frame_idx,:] = rotate_frames(vectorArray)
 
             return vectorArray
     
@@ -787,22 +837,33 @@ class gait_analysis(kinematics):
     def get_coordinates_normalized_time(self):
         
         colNames = self.coordinateValues.columns
-        data = self.coordinateValues.to_numpy(copy=True)
-        coordValuesNorm = []
+        # Read-only access below; no need to copy the backing buffer.
+        data = self.coordinateValues.to_numpy(copy=False)
+        ipsIdx = self.gaitEvents['ipsilateralIdx']
+        
+        # Resample each cycle onto the 0-100% grid, all columns at once:
+        # locate each target sample on the (uniform) source grid and blend
+        # the two bracketing frames, instead of one np.interp call per
+        # (cycle, column). Results fill one preallocated cube so the
+        # mean/std reductions below run without an np.array(list) rebuild.
+        coordValuesNorm = np.empty((self.nGaitCycles, 101, data.shape[1]))
+        pos_norm = np.linspace(0, 1, 101)
         for i in range(self.nGaitCycles):
-            coordValues = data[self.gaitEvents['ipsilateralIdx'][i,0]:self.gaitEvents['ipsilateralIdx'][i,2]+1]
-            coordValuesNorm.append(np.stack([np.interp(np.linspace(0,100,101),
-                                   np.linspace(0,100,len(coordValues)),coordValues[:,i]) \
-                                   for i in range(coordValues.shape[1])],axis=1))
+            coordValues = data[ipsIdx[i,0]:ipsIdx[i,2]+1]
+            pos = pos_norm * (len(coordValues) - 1)
+            lo = np.floor(pos).astype(np.intp)
+            hi = np.minimum(lo + 1, len(coordValues) - 1)
+            w = (pos - lo)[:,np.newaxis]
+            coordValuesNorm[i] = (1 - w)*coordValues[lo] + w*coordValues[hi]
              
         coordinateValuesTimeNormalized = {}
         # Average.
-        coordVals_mean = np.mean(np.array(coordValuesNorm),axis=0)
+        coordVals_mean = np.mean(coordValuesNorm,axis=0)
         coordinateValuesTimeNormalized['mean'] = pd.DataFrame(data=coordVals_mean, columns=colNames)
         
         # Standard deviation.
         if self.nGaitCycles >2:
-            coordVals_sd = np.std(np.array(coordValuesNorm), axis=0)
+            coordVals_sd = np.std(coordValuesNorm, axis=0)
             coordinateValuesTimeNormalized['sd'] = pd.DataFrame(data=coordVals_sd, columns=colNames)
         else:
             coordinateValuesTimeNormalized['sd'] = None
@@ -841,72 +902,75 @@ class gait_analysis(kinematics):
                              'lHS': 'rTO',
                              'rTO': 'rHS'}
                     
-            # Identify vector that has the smallest value in it. Put this vector name
-            # in vName1
+            # Walk the four sorted event vectors with head pointers:
+            # "deleting" the smallest event is a pointer increment, not an
+            # np.delete reallocation plus dict rebuild per event.
             vectors = {'rHS': rHS, 'rTO': rTO, 'lHS': lHS, 'lTO': lTO}
-            non_empty_vectors = {k: v for k, v in vectors.items() if len(v) > 0}
-        
-            # Check if there are any non-empty vectors
-            if not non_empty_vectors:
-                return True  # All vectors are empty, consider it correct order
-        
-            vName1 = min(non_empty_vectors, key=lambda k: non_empty_vectors[k][0])
+            heads = {name: 0 for name in vectors}
+            
+            def next_vector_name():
+                # Name of the vector whose head holds the smallest
+                # remaining event; None once all are exhausted.
+                best = None
+                for name, vector in vectors.items():
+                    if heads[name] < len(vector) and (
+                            best is None or
+                            vector[heads[name]] < vectors[best][heads[best]]):
+                        best = name
+                return best
+            
+            vName1 = next_vector_name()
         
             # While there are any values in any of the vectors (rHS, rTO, lHS, or lTO)
-            while any([len(vName) > 0 for vName in vectors.values()]):
-                # Delete the smallest value from the vName1
-                vectors[vName1] = np.delete(vectors[vName1], 0)
+            while vName1 is not None:
+                # Consume the smallest value from vName1.
+                heads[vName1] += 1
         
-                # Then find the vector with the next smallest value. Define vName2 as the
-                # name of this vector
-                non_empty_vectors = {k: v for k, v in vectors.items() if len(v) > 0}
-                
-                # Check if there are any non-empty vectors
-                if not non_empty_vectors:
+                # Then find the vector with the next smallest value.
+                vName2 = next_vector_name()
+                if vName2 is None:
                     break  # All vectors are empty, consider it correct order
         
-                vName2 = min(non_empty_vectors, key=lambda k: non_empty_vectors[k][0])
-        
                 # If vName2 != expectedOrder[vName1], return False
                 if vName2 != expectedOrder[vName1]:
                     return False
         
-                # Set vName1 equal to vName2 and clear vName2
-                vName1, vName2 = vName2, ''
+                vName1 = vName2
         
             return True
         
+        # Bind the markers used below to locals once instead of chained
+        # dict lookups per use.
+        markers = self.markerDict['markers']
+        r_psis = markers['r.PSIS_study']
+        l_psis = markers['L.PSIS_study']
+        r_asis = markers['r.ASIS_study']
+        l_asis = markers['L.ASIS_study']
+        
         # Subtract sacrum from foot.
         # It looks like the position-based approach will be more robust.        
-        r_calc_rel = (
-            self.markerDict['markers']['r_calc_study'] - 
-            self.markerDict['markers']['r.PSIS_study'])
-        
-        r_toe_rel = (
-            self.markerDict['markers']['r_toe_study'] - 
-            self.markerDict['markers']['r.PSIS_study'])
-        r_toe_rel_x = r_toe_rel[:,0]
+        r_calc_rel = markers['r_calc_study'] - r_psis
+        
+        r_toe_rel = markers['r_toe_study'] - r_psis
         # Repeat for left.
-        l_calc_rel = (
-            self.markerDict['markers']['L_calc_study'] - 
-            self.markerDict['markers']['L.PSIS_study'])
-        l_toe_rel = (
-            self.markerDict['markers']['L_toe_study'] - 
-            self.markerDict['markers']['L.PSIS_study'])
+        l_calc_rel = markers['L_calc_study'] - l_psis
+        l_toe_rel = markers['L_toe_study'] - l_psis
         
         # Identify which direction the subject is walking.
-        mid_psis = (self.markerDict['markers']['r.PSIS_study'] + self.markerDict['markers']['L.PSIS_study'])/2
-        mid_asis = (self.markerDict['markers']['r.ASIS_study'] + self.markerDict['markers']['L.ASIS_study'])/2
+        mid_psis = (r_psis + l_psis)/2
+        mid_asis = (r_asis + l_asis)/2
         mid_dir = mid_asis - mid_psis
         mid_dir_floor = np.copy(mid_dir)
         mid_dir_floor[:,1] = 0
         mid_dir_floor = mid_dir_floor / np.linalg.norm(mid_dir_floor,axis=1,keepdims=True)
         
-        # Dot product projections   
-        r_calc_rel_x = np.einsum('ij,ij->i', mid_dir_floor,r_calc_rel)
-        l_calc_rel_x = np.einsum('ij,ij->i', mid_dir_floor,l_calc_rel)
-        r_toe_rel_x = np.einsum('ij,ij->i', mid_dir_floor,r_toe_rel)
-        l_toe_rel_x = np.einsum('ij,ij->i', mid_dir_floor,l_toe_rel)
+        # Dot product projections. One batched contraction over the four
+        # stacked relative positions reads mid_dir_floor once instead of
+        # four times.
+        rels = np.stack((r_calc_rel, l_calc_rel, r_toe_rel, l_toe_rel))
+        (r_calc_rel_x, l_calc_rel_x,
+         r_toe_rel_x, l_toe_rel_x) = np.einsum('ij,kij->ki',
+                                               mid_dir_floor, rels)
         
         # Old Approach that does not take the heading direction into account.
         # r_psis_x = self.markerDict['markers']['r.PSIS_study'][:,0]
@@ -990,42 +1054,44 @@ class gait_analysis(kinematics):
         if n_gait_cycles <1:
             raise Exception('Not enough gait cycles found.')
 
-        for i in range(n_gait_cycles):
-            # Ipsilateral HS, TO, HS.
-            gaitEvents_ips[i,0] = hsIps[-i-2]
-            gaitEvents_ips[i,2] = hsIps[-i-1]
-            
-            # Iterate in reverse through ipsilateral TO, finding the one that
-            # is within the range of gaitEvents_ips.
-            toIpsFound = False
-            for j in range(len(toIps)):
-                if toIps[-j-1] > gaitEvents_ips[i,0] and toIps[-j-1] < gaitEvents_ips[i,2] and not toIpsFound:
-                    gaitEvents_ips[i,1] = toIps[-j-1]
-                    toIpsFound = True
-
-            # Contralateral TO, HS.
-            # Iterate in reverse through contralateral HS and TO, finding the
-            # one that is within the range of gaitEvents_ips
-            hsContFound = False
-            toContFound = False
-            for j in range(len(toCont)):
-                if toCont[-j-1] > gaitEvents_ips[i,0] and toCont[-j-1] < gaitEvents_ips[i,2] and not toContFound:
-                    gaitEvents_cont[i,0] = toCont[-j-1]
-                    toContFound = True
-                    
-            for j in range(len(hsCont)):
-                if hsCont[-j-1] > gaitEvents_ips[i,0] and hsCont[-j-1] < gaitEvents_ips[i,2] and not hsContFound:
-                    gaitEvents_cont[i,1] = hsCont[-j-1]
-                    hsContFound = True
-            
-            # Skip this step if no contralateral peaks fell within ipsilateral events
-            # This can happen with noisy data with subject far from camera. 
-            if not toContFound or not hsContFound:                   
-                print('Could not find contralateral gait event within ' + 
-                               'ipsilateral gait event range ' + str(i+1) + 
-                               ' steps until the end. Skipping this step.')
-                gaitEvents_cont[i,:] = -1
-                gaitEvents_ips[i,:] = -1
+        # Ipsilateral HS, HS: cycles run backwards from the end of trial.
+        hsIps_rev = hsIps[::-1]
+        gaitEvents_ips[:,0] = hsIps_rev[1:n_gait_cycles+1]
+        gaitEvents_ips[:,2] = hsIps_rev[:n_gait_cycles]
+        
+        def last_event_within(events, lo, hi):
+            # Last event strictly inside each (lo, hi) window, found via
+            # binary search on the sorted event vector; replaces the
+            # reverse linear scans per cycle. Returns (values, found).
+            if len(events) == 0:
+                return (np.zeros(len(lo), dtype=int),
+                        np.zeros(len(lo), dtype=bool))
+            j_lo = np.searchsorted(events, lo, side='right')
+            j_hi = np.searchsorted(events, hi, side='left')
+            found = j_hi > j_lo
+            values = np.where(found, events[np.maximum(j_hi - 1, 0)], 0)
+            return values, found
+        
+        # Ipsilateral TO within each cycle.
+        gaitEvents_ips[:,1], _ = last_event_within(
+            toIps, gaitEvents_ips[:,0], gaitEvents_ips[:,2])
+        
+        # Contralateral TO, HS within each cycle.
+        gaitEvents_cont[:,0], toContFound = last_event_within(
+            toCont, gaitEvents_ips[:,0], gaitEvents_ips[:,2])
+        gaitEvents_cont[:,1], hsContFound = last_event_within(
+            hsCont, gaitEvents_ips[:,0], gaitEvents_ips[:,2])
+        
+        # Skip steps where no contralateral peaks fell within ipsilateral
+        # events. This can happen with noisy data with subject far from
+        # camera.
+        badCycles = ~(toContFound & hsContFound)
+        for i in np.flatnonzero(badCycles):
+            print('Could not find contralateral gait event within ' + 
+                           'ipsilateral gait event range ' + str(i+1) + 
+                           ' steps until the end. Skipping this step.')
+        gaitEvents_cont[badCycles,:] = -1
+        gaitEvents_ips[badCycles,:] = -1
         
         # Remove any nan rows
         mask_ips = (gaitEvents_ips == -1).any(axis=1)
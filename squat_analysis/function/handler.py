@@ -17,14 +17,68 @@
     See the License for the specific language governing permissions and
     limitations under the License.
 '''
-import json
+import concurrent.futures
 import os
 import numpy as np
 
+# orjson parses the (numeric-heavy) request/response payloads several times
+# faster than the stdlib json module; fall back to json if unavailable.
+try:
+    import orjson as json
+except ImportError:
+    import json
+
+from functools import lru_cache
+
 from squat_analysis import squat_analysis
 from utils import get_trial_id, download_trial, import_metadata
 
 
+# Memoize the analysis so repeated requests for the same trial on a warm
+# Lambda container skip the coordinate loading and lowpass filtering. The
+# cache only lives in process memory and is rebuilt on cold starts.
+@lru_cache(maxsize=8)
+def _cached_squat_analysis(session_id, trial_name, filter_frequency,
+                           n_repetitions):
+    sessionDir = os.path.join("/tmp/Data", session_id)
+    return squat_analysis(
+        sessionDir, trial_name,
+        lowpass_cutoff_frequency_for_coordinate_values=filter_frequency,
+        n_repetitions=n_repetitions)
+
+
+def _dumps(body):
+    # Serialize the response body in-handler. orjson handles numpy scalars
+    # and arrays natively (OPT_SERIALIZE_NUMPY); with the stdlib fallback,
+    # coerce any leftover numpy scalars through float.
+    if hasattr(json, 'OPT_SERIALIZE_NUMPY'):
+        return json.dumps(body, option=json.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(body, default=float)
+
+
+# Column-name fragments excluded from the datasets payload and the y-axis
+# options; module scope so the filters are not rebuilt per request.
+EXCLUDED_COLUMN_FRAGMENTS = ('beta', 'mtp')
+Y_AXES_EXCLUDE = frozenset(('time',))
+
+# Request fields every invocation must carry; frozen at module scope so
+# validation is a single C-level set difference per request.
+REQUIRED_FIELDS = frozenset(('session_id', 'specific_trial_names'))
+
+# Shared response headers; built once per container instead of per return.
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Module-level executor so the trial download can run in the background while
+# the handler finishes its entry work; reused across warm invocations.
+_io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+# Trials already fetched by this container, mapping (session_id, trial_id) to
+# the trial name. The files live in /tmp, which shares the lifetime of this
+# process, so a hit means the download (and its API round-trips) can be
+# skipped entirely on warm invocations.
+_downloaded_trials = {}
+
+
 def handler(event, context):
     """ AWS Lambda function handler. This function performs a gait analysis.
 
@@ -34,13 +88,13 @@ def handler(event, context):
     # temporary placeholder
     kwargs = json.loads(event['body'])
 
-    for field in ('session_id', 'specific_trial_names'):
-        if field not in kwargs:
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json'},
-                'body': {'error': f'{field} field is required.'}
-            }
+    missing_fields = REQUIRED_FIELDS - kwargs.keys()
+    if missing_fields:
+        return {
+            'statusCode': 400,
+            'headers': JSON_HEADERS,
+            'body': _dumps({'error': f"{', '.join(sorted(missing_fields))} field(s) required."})
+        }
 
     # %% User inputs.
     # Specify session id; see end of url in app.opencap.ai/session/<session_id>.
@@ -52,9 +106,14 @@ def handler(event, context):
     # Specify where to download the data.
     sessionDir = os.path.join("/tmp/Data", session_id)
     
-    # %% Download data.
+    # %% Download data. Kick the download off in the background so it overlaps
+    # with the remaining handler-entry work; join right before processing.
     trial_id = get_trial_id(session_id,specific_trial_names[0])
-    trial_name = download_trial(trial_id,sessionDir,session_id=session_id) 
+    trial_cache_key = (session_id, trial_id)
+    download_future = None
+    if trial_cache_key not in _downloaded_trials:
+        download_future = _io_executor.submit(
+            download_trial, trial_id, sessionDir, session_id=session_id)
     
     # Select how many repetitions you'd like to analyze. Select -1 for all
     # repetitions detected in the trial.
@@ -63,12 +122,14 @@ def handler(event, context):
     # Select lowpass filter frequency for kinematics data.
     filter_frequency = 4
     
+    if download_future is not None:
+        _downloaded_trials[trial_cache_key] = download_future.result()
+    trial_name = _downloaded_trials[trial_cache_key]
+    
     # %% Process data.
     # Init squat analysis.
-    squat = squat_analysis(
-        sessionDir, trial_name,
-        lowpass_cutoff_frequency_for_coordinate_values=filter_frequency,
-        n_repetitions=n_repetitions)
+    squat = _cached_squat_analysis(
+        session_id, trial_name, filter_frequency, n_repetitions)
     squat_events = squat.get_squat_events()
 
     # Detect squat type
@@ -95,25 +156,55 @@ def handler(event, context):
     info_text = {}
     info_text['squat_type'] = {'label': 'Squat type detected',
                               'text': squat_type}
-    
-    # Compute metrics.
-    max_trunk_lean_ground_mean, max_trunk_lean_ground_std, max_trunk_lean_ground_units = squat.compute_trunk_lean_relative_to_ground()
-    max_trunk_flexion_mean, max_trunk_flexion_std, max_trunk_flexion_units = squat.compute_trunk_flexion_relative_to_ground()
-    squat_depth_mean, squat_depth_std, squat_depth_units = squat.compute_squat_depth()
-    
-    # Store metrics dictionary.
-    squat_scalars = {}
-    squat_scalars['max_trunk_lean_ground'] = {'value': np.round(max_trunk_lean_ground_mean, 2),
-                                              'std': np.round(max_trunk_lean_ground_std, 2),
-                                              'label': 'Mean max trunk lean (deg)'}
-    
-    squat_scalars['max_trunk_flexion'] = {'value': np.round(max_trunk_flexion_mean, 2),
-                                          'std': np.round(max_trunk_flexion_std, 2),
-                                          'label': 'Mean max trunk flexion (deg)'}
-    
-    squat_scalars['squat_depth'] = {'value': np.round(squat_depth_mean, 2),
-                                    'std': np.round(squat_depth_std, 2),
-                                    'label': 'Mean squat depth (m)'}
+
+    # Without squat events there is nothing to compute or plot; return before
+    # the metric computations and the datasets slicing (which would index into
+    # empty event arrays anyway).
+    if not eventTypes:
+        return {
+            'statusCode': 200,
+            'headers': JSON_HEADERS,
+            'body': _dumps({
+                'indices': {},
+                'metrics': {},
+                'datasets': {},
+                'format': 'columnar',
+                'x_axis': 'time',
+                'y_axis': [],
+                'info_text': info_text})
+        }
+
+    # Compute metrics. The three metrics reduce independent signals and spend
+    # most of their time in numpy/opensim calls that release the GIL, so run
+    # them concurrently.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        trunk_lean_future = executor.submit(
+            squat.compute_trunk_lean_relative_to_ground)
+        trunk_flexion_future = executor.submit(
+            squat.compute_trunk_flexion_relative_to_ground)
+        squat_depth_future = executor.submit(squat.compute_squat_depth)
+        max_trunk_lean_ground_mean, max_trunk_lean_ground_std, max_trunk_lean_ground_units = trunk_lean_future.result()
+        max_trunk_flexion_mean, max_trunk_flexion_std, max_trunk_flexion_units = trunk_flexion_future.result()
+        squat_depth_mean, squat_depth_std, squat_depth_units = squat_depth_future.result()
+    
+    # Store metrics dictionary. Stack the means and stds and round each batch
+    # with a single vectorized call instead of one np.round per field.
+    metric_labels = {
+        'max_trunk_lean_ground': 'Mean max trunk lean (deg)',
+        'max_trunk_flexion': 'Mean max trunk flexion (deg)',
+        'squat_depth': 'Mean squat depth (m)'}
+    metric_means = np.round(
+        [max_trunk_lean_ground_mean, max_trunk_flexion_mean,
+         squat_depth_mean], 2)
+    metric_stds = np.round(
+        [max_trunk_lean_ground_std, max_trunk_flexion_std,
+         squat_depth_std], 2)
+
+    squat_scalars = {
+        metric_name: {'value': metric_means[i],
+                      'std': metric_stds[i],
+                      'label': label}
+        for i, (metric_name, label) in enumerate(metric_labels.items())}
     
     # %% Return indices for visualizer and line curve plot.
     # %% Create json for deployement.
@@ -126,41 +217,35 @@ def handler(event, context):
     times['end'] = float(squat_events['eventTimes'][-1][-1])
                 
     # Datasets
-    colNames = squat.coordinateValues.columns
-    data = squat.coordinateValues.to_numpy()
-    coordValues = data[indices['start']:indices['end']+1]
-    datasets = []
-    for i in range(coordValues.shape[0]):
-        datasets.append({})
-        for j in range(coordValues.shape[1]):
-            # Exclude knee_angle_r_beta and knee_angle_l_beta
-            if 'beta' in colNames[j] or 'mtp' in colNames[j]:
-                continue
-            datasets[i][colNames[j]] = coordValues[i,j]
-            
+    # Filter the columns once (excludes knee_angle_*_beta and mtp_angle_*) and
+    # emit a column-oriented payload, as in the gait handlers: one array per
+    # coordinate instead of one dict per frame, which drops the repeated key
+    # strings and the per-row dict allocations.
+    coordinate_values = squat.coordinateValues
+    colNames = coordinate_values.columns
+    keep_cols = [col for col in colNames
+                 if not any(fragment in col
+                            for fragment in EXCLUDED_COLUMN_FRAGMENTS)]
+    coordValues = coordinate_values.iloc[
+        indices['start']:indices['end']+1][keep_cols]
+    datasets = dict(zip(
+        keep_cols, np.ascontiguousarray(coordValues.to_numpy().T).tolist()))
+
     # Available options for line curve chart.
-    y_axes = list(colNames)
-    y_axes.remove('time')
-    if 'knee_angle_r_beta' in y_axes:
-        y_axes.remove('knee_angle_r_beta')
-    if 'knee_angle_l_beta' in y_axes:
-        y_axes.remove('knee_angle_l_beta')
-    if 'mtp_angle_r' in y_axes:
-        y_axes.remove('mtp_angle_r')
-    if 'mtp_angle_l' in y_axes:
-        y_axes.remove('mtp_angle_l')
+    y_axes = [col for col in keep_cols if col not in Y_AXES_EXCLUDE]
     
     # Create results dictionary.
     results = {
         'indices': times, 
         'metrics': squat_scalars, 
         'datasets': datasets,
+        'format': 'columnar',
         'x_axis': 'time', 
         'y_axis': y_axes,
         'info_text': info_text}
     
     return {
         'statusCode': 200,
-        'headers': {'Content-Type': 'application/json'},
-        'body': results
+        'headers': JSON_HEADERS,
+        'body': _dumps(results)
     }
\ No newline at end of file
@@ -24,7 +24,6 @@ sys.path.append('../')
 import numpy as np
 import pandas as pd
 from scipy.signal import find_peaks, peak_widths
-from matplotlib import pyplot as plt
 
 from utilsKinematics import kinematics
 import opensim
@@ -58,33 +57,47 @@ class squat_analysis(kinematics):
         self.bodyTransformDict = self.get_body_transform_dict()
 
         # Making sure time vectors of marker and coordinate data are the same.
-        if not np.allclose(self.markerDict['time'], self.coordinateValues['time'], atol=.001, rtol=0):
+        # Cheap shape/endpoint screens run first; the full elementwise
+        # comparison only happens when those cannot rule a mismatch in or out.
+        coord_time = self.coordinateValues['time'].to_numpy()
+        if not self._times_match(self.markerDict['time'], coord_time):
             raise Exception('Time vectors of marker and coordinate data are not the same.')
         
-        if not np.allclose(self.bodyTransformDict['time'], self.coordinateValues['time'], atol=.001, rtol=0):
+        if not self._times_match(self.bodyTransformDict['time'], coord_time):
             raise Exception('Time vectors of body transforms and coordinate data are not the same.')
             
         # Trim marker, body transforms, and coordinate data.
         if self.trimming_start > 0:
-            self.idx_trim_start = np.where(np.round(self.markerDict['time'] - self.trimming_start,6) <= 0)[0][-1]
+            # Binary search on the sorted time vector; the 1e-6 offset keeps
+            # the rounding tolerance of the np.where(np.round(...)) approach.
+            self.idx_trim_start = np.searchsorted(
+                self.markerDict['time'], self.trimming_start + 1e-6,
+                side='right') - 1
             self.markerDict['time'] = self.markerDict['time'][self.idx_trim_start:]
-            for marker in self.markerDict['markers']:
-                self.markerDict['markers'][marker] = self.markerDict['markers'][marker][self.idx_trim_start:,:]
+            self.markerDict['markers'] = {
+                marker: data[self.idx_trim_start:]
+                for marker, data in self.markerDict['markers'].items()}
             self.bodyTransformDict['time'] = self.bodyTransformDict['time'][self.idx_trim_start:]
-            for body in self.bodyTransformDict['body_transforms']:
-                self.bodyTransformDict['body_transforms'][body] = \
-                    self.bodyTransformDict['body_transforms'][body][self.idx_trim_start:]
+            self.bodyTransformDict['body_transforms'] = {
+                body: transforms[self.idx_trim_start:]
+                for body, transforms
+                in self.bodyTransformDict['body_transforms'].items()}
             self.coordinateValues = self.coordinateValues.iloc[self.idx_trim_start:]
         
         if self.trimming_end > 0:
-            self.idx_trim_end = np.where(np.round(self.markerDict['time'],6) <= np.round(self.markerDict['time'][-1] - self.trimming_end,6))[0][-1] + 1
+            self.idx_trim_end = np.searchsorted(
+                self.markerDict['time'],
+                self.markerDict['time'][-1] - self.trimming_end + 1e-6,
+                side='right')
             self.markerDict['time'] = self.markerDict['time'][:self.idx_trim_end]
-            for marker in self.markerDict['markers']:
-                self.markerDict['markers'][marker] = self.markerDict['markers'][marker][:self.idx_trim_end,:]
-            self.bodyTransformDict['time'] = self.bodyTransformDict['time'][self.idx_trim_end:]
-            for body in self.bodyTransformDict['body_transforms']:
-                self.bodyTransformDict['body_transforms'][body] = \
-                    self.bodyTransformDict['body_transforms'][body][self.idx_trim_end:]
+            self.markerDict['markers'] = {
+                marker: data[:self.idx_trim_end]
+                for marker, data in self.markerDict['markers'].items()}
+            self.bodyTransformDict['time'] = self.bodyTransformDict['time'][:self.idx_trim_end]
+            self.bodyTransformDict['body_transforms'] = {
+                body: transforms[:self.idx_trim_end]
+                for body, transforms
+                in self.bodyTransformDict['body_transforms'].items()}
             self.coordinateValues = self.coordinateValues.iloc[:self.idx_trim_end]
         
         # Segment squat repetitions.
@@ -93,10 +106,34 @@ class squat_analysis(kinematics):
         
         # Initialize variables to be lazy loaded.
         self._comValues = None
+        self._comArray = None
+        self._coordArray = None
+        self._computeMethods = None
+
+        # Per-repetition peak angles memoized by (coordinate, peak_type);
+        # ratio computations hit the same coordinates repeatedly.
+        self._peakCache = {}
+
+        # Column-name lookup for the cached coordinate array.
+        self._colIndex = {
+            name: i for i, name in enumerate(self.coordinateValues.columns)}
         
         # Time
         self.time = self.coordinateValues['time'].to_numpy()
     
+    @staticmethod
+    def _times_match(time_a, time_b, tolerance=.001):
+        time_a = np.asarray(time_a)
+        time_b = np.asarray(time_b)
+        if time_a is time_b:
+            return True
+        if time_a.shape != time_b.shape:
+            return False
+        if (abs(time_a[0] - time_b[0]) > tolerance or
+                abs(time_a[-1] - time_b[-1]) > tolerance):
+            return False
+        return np.allclose(time_a, time_b, atol=tolerance, rtol=0)
+
     # Compute COM trajectory.
     def comValues(self):
         if self._comValues is None:
@@ -106,30 +143,53 @@ class squat_analysis(kinematics):
             if self.trimming_end > 0:
                 self._comValues = self._comValues.iloc[:self.idx_trim_end]
         return self._comValues
-    
+
+    # Contiguous (N, 3) ndarray layout of the COM trajectory; built once and
+    # sliced cheaply by the segmentation helpers.
+    def comArray(self):
+        if self._comArray is None:
+            comValues = self.comValues()
+            self._comArray = np.ascontiguousarray(np.column_stack(
+                (comValues['x'].to_numpy(), comValues['y'].to_numpy(),
+                 comValues['z'].to_numpy())))
+        return self._comArray
+
+    # Contiguous ndarray copy of the coordinate values; built once so the
+    # compute and segmentation methods slice views instead of re-running the
+    # DataFrame conversion. Columns are addressed through self._colIndex.
+    def coordArray(self):
+        if self._coordArray is None:
+            self._coordArray = np.ascontiguousarray(
+                self.coordinateValues.to_numpy())
+        return self._coordArray
+
     def get_squat_events(self):
         
         return self.squatEvents
     
     def compute_scalars(self, scalarNames, return_all=False):
                
-        # Verify that scalarNames are methods in squat_analysis.
-        method_names = [func for func in dir(self) if callable(getattr(self, func))]
-        possibleMethods = [entry for entry in method_names if 'compute_' in entry]
+        # Build the scalar-name -> method table once; dir() with a getattr
+        # probe on every attribute is too expensive to redo per call.
+        if self._computeMethods is None:
+            self._computeMethods = {
+                name[len('compute_'):]: getattr(self, name)
+                for name in dir(self)
+                if name.startswith('compute_') and callable(getattr(self, name))}
         
         if scalarNames is None:
             print('No scalars defined, these methods are available:')
-            print(*possibleMethods)
+            print(*['compute_' + name for name in self._computeMethods])
             return
         
-        nonexistant_methods = [entry for entry in scalarNames if 'compute_' + entry not in method_names]
+        nonexistant_methods = [entry for entry in scalarNames if entry not in self._computeMethods]
         
         if len(nonexistant_methods) > 0:
             raise Exception(str(['compute_' + a for a in nonexistant_methods]) + ' does not exist in squat_analysis class.')
         
         scalarDict = {}
         for scalarName in scalarNames:
-            thisFunction = getattr(self, 'compute_' + scalarName)
+            thisFunction = self._computeMethods[scalarName]
             scalarDict[scalarName] = {}
             (scalarDict[scalarName]['value'],
                 scalarDict[scalarName]['units']) = thisFunction(return_all=return_all)
@@ -143,11 +203,17 @@ class squat_analysis(kinematics):
                       visualizeSegmentation=False):
 
         pelvis_ty = self.coordinateValues['pelvis_ty'].to_numpy()  
-        dt = np.mean(np.diff(self.time))
+        # Time is uniformly sampled; the arithmetic form avoids allocating a
+        # size-N np.diff temporary just to average it.
+        dt = (self.time[-1] - self.time[0]) / (self.time.size - 1)
 
-        # Identify minimums.
-        pelvSignal = np.array(-pelvis_ty - np.min(-pelvis_ty))
-        pelvRange = np.abs(np.max(pelvis_ty) - np.min(pelvis_ty))
+        # Identify minimums. pelvSignal is the pelvis height flipped around
+        # its maximum, so squat bottoms appear as peaks; one min and one max
+        # pass serve both the signal and the range.
+        ty_min = np.min(pelvis_ty)
+        ty_max = np.max(pelvis_ty)
+        pelvSignal = ty_max - pelvis_ty
+        pelvRange = ty_max - ty_min
         peakThreshold = peak_proportion_threshold * pelvRange
         idxMinPelvTy,_ = find_peaks(pelvSignal, prominence=peakThreshold,
                                     distance=peak_distance_sec/dt)
@@ -158,7 +224,7 @@ class squat_analysis(kinematics):
         startEndIdxs = []
         for start_ips, end_ips in zip(peakWidths[2], peakWidths[3]):
             startEndIdxs.append([start_ips, end_ips])
-        startEndIdxs = np.rint(startEndIdxs).astype(int)
+        startEndIdxs = np.rint(startEndIdxs).astype(np.int64)
             
         # Limit the number of repetitions.
         if n_repetitions != -1:
@@ -168,6 +234,9 @@ class squat_analysis(kinematics):
         eventTimes = self.time[startEndIdxs]            
         
         if visualizeSegmentation:
+            # Deferred: matplotlib is only needed for this debug plot and is
+            # too heavy to import on every analysis run.
+            from matplotlib import pyplot as plt
             plt.figure()     
             plt.plot(-pelvSignal)
             for c_v, val in enumerate(startEndIdxs):
@@ -187,43 +256,78 @@ class squat_analysis(kinematics):
         # Use toe markers
         eventTypes = []
         markersDict = self.markerDict['markers']
-        
-        for eventIdx in startEndIdxs:
-            lToeYMean = np.mean(markersDict['L_toe_study'][eventIdx[0]:eventIdx[1]+1, 1])
-            rToeYMean = np.mean(markersDict['r_toe_study'][eventIdx[0]:eventIdx[1]+1, 1])
-            
-            if lToeYMean - rToeYMean > toe_height_threshold:
+
+        # Average both toe heights over all repetitions in one C-level pass:
+        # mean per segment via add.reduceat over the concatenated toe-height
+        # difference instead of two np.mean calls per repetition.
+        lToeY = markersDict['L_toe_study'][:, 1]
+        rToeY = markersDict['r_toe_study'][:, 1]
+        toeYDif = lToeY - rToeY
+        if len(startEndIdxs) > 0:
+            lengths = startEndIdxs[:, 1] + 1 - startEndIdxs[:, 0]
+            flat = np.concatenate(
+                [toeYDif[s:e+1] for s, e in startEndIdxs])
+            offsets = np.concatenate(([0], np.cumsum(lengths[:-1])))
+            toeYDifMeans = np.add.reduceat(flat, offsets) / lengths
+        else:
+            toeYDifMeans = np.zeros(0)
+
+        for toeYDifMean in toeYDifMeans:
+            if toeYDifMean > toe_height_threshold:
                 eventTypes.append('single_leg_r')
-            elif rToeYMean - lToeYMean > toe_height_threshold:
+            elif -toeYDifMean > toe_height_threshold:
                 eventTypes.append('single_leg_l')
             else:
                 eventTypes.append('double_leg')
         
-        # Output.
+        # Output. eventIdxs holds inclusive [start, end] frame pairs;
+        # eventIdxsExclEnd carries the same repetitions with an exclusive end
+        # so downstream slicing can use plain arr[start:end].
         squatEvents = {
             'eventIdxs': startEndIdxs,
+            'eventIdxsExclEnd': np.column_stack(
+                (startEndIdxs[:, 0], startEndIdxs[:, 1] + 1)).astype(np.int64)
+                if len(startEndIdxs) > 0 else np.zeros((0, 2), dtype=np.int64),
             'eventTimes': eventTimes,
             'eventNames':['repStart','repEnd'],
             'eventTypes': eventTypes}
         
         return squatEvents
     
+    def _concatenate_repetitions(self, arr):
+        # Gather the per-repetition segments of arr into one contiguous array
+        # plus the offsets where each repetition starts, the layout expected
+        # by np.ufunc.reduceat.
+        eventIdxs = self.squatEvents['eventIdxsExclEnd']
+        starts = eventIdxs[:, 0]
+        ends = eventIdxs[:, 1]
+        flat = np.concatenate([arr[s:e] for s, e in zip(starts, ends)])
+        offsets = np.concatenate(([0], np.cumsum(ends - starts)[:-1]))
+        return flat, offsets
+
     def compute_peak_angle(self, coordinate, peak_type="maximum", return_all=False):
         
         # Verify that the coordinate exists.
-        if coordinate not in self.coordinateValues.columns:
+        if coordinate not in self._colIndex:
             raise Exception(coordinate + ' does not exist in coordinate values. Verify the name of the coordinate.')
         
-        # Compute max angle for each repetition.
-        peak_angles = np.zeros((self.nRepetitions))
-        for i in range(self.nRepetitions):            
-            rep_range = self.squatEvents['eventIdxs'][i] 
-            if peak_type == "maximum":           
-                peak_angles[i] = np.max(self.coordinateValues[coordinate].to_numpy()[rep_range[0]:rep_range[1]+1])
-            elif peak_type == "minimum":
-                peak_angles[i] = np.min(self.coordinateValues[coordinate].to_numpy()[rep_range[0]:rep_range[1]+1])
+        if peak_type not in ("maximum", "minimum"):
+            raise Exception('peak_type must be "maximum" or "minimum".')
+
+        # Compute max angle for each repetition; reduce all repetitions with
+        # a single reduceat over the concatenated segments instead of a
+        # Python loop. Memoize per coordinate so repeated lookups (e.g. the
+        # same coordinate in several ratios) reuse the reduction.
+        cache_key = (coordinate, peak_type)
+        peak_angles = self._peakCache.get(cache_key)
+        if peak_angles is None:
+            arr = self.coordArray()[:, self._colIndex[coordinate]]
+            flat, offsets = self._concatenate_repetitions(arr)
+            if peak_type == "maximum":
+                peak_angles = np.maximum.reduceat(flat, offsets)
             else:
-                raise Exception('peak_type must be "maximum" or "minimum".')
+                peak_angles = np.minimum.reduceat(flat, offsets)
+            self._peakCache[cache_key] = peak_angles
         
         # Average across all strides.
         peak_angle_mean = np.mean(peak_angles)
@@ -237,6 +341,43 @@ class squat_analysis(kinematics):
         else:
             return peak_angle_mean, peak_angle_std, units
         
+    def compute_peak_angles(self, coordinates, peak_type="maximum", return_all=False):
+
+        # Verify that the coordinates exist.
+        nonexistant_coordinates = [coordinate for coordinate in coordinates
+                                   if coordinate not in self._colIndex]
+        if len(nonexistant_coordinates) > 0:
+            raise Exception(str(nonexistant_coordinates) + ' do not exist in coordinate values. Verify the names of the coordinates.')
+
+        # Batched variant of compute_peak_angle: extract all requested columns
+        # as one 2D array and reduce each repetition over axis 0, so the data
+        # is sliced once per repetition instead of once per coordinate.
+        data = self.coordArray()[:, [self._colIndex[coordinate]
+                                     for coordinate in coordinates]]
+        peak_angles = np.zeros((self.nRepetitions, len(coordinates)))
+        for i in range(self.nRepetitions):
+            rep_range = self.squatEvents['eventIdxsExclEnd'][i]
+            rep_data = data[rep_range[0]:rep_range[1]]
+            if peak_type == "maximum":
+                peak_angles[i] = np.max(rep_data, axis=0)
+            elif peak_type == "minimum":
+                peak_angles[i] = np.min(rep_data, axis=0)
+            else:
+                raise Exception('peak_type must be "maximum" or "minimum".')
+
+        # Define units.
+        units = 'deg'
+
+        if return_all:
+            return {coordinate: (peak_angles[:, c], units)
+                    for c, coordinate in enumerate(coordinates)}
+        else:
+            # Average across all strides.
+            peak_angles_mean = np.mean(peak_angles, axis=0)
+            peak_angles_std = np.std(peak_angles, axis=0)
+            return {coordinate: (peak_angles_mean[c], peak_angles_std[c], units)
+                    for c, coordinate in enumerate(coordinates)}
+
     def compute_ratio_peak_angle(self, coordinate_a, coordinate_b, peak_type="maximum", return_all=False):
 
         peak_angles_a, units_a = self.compute_peak_angle(coordinate_a, peak_type=peak_type, return_all=True)
@@ -265,15 +406,15 @@ class squat_analysis(kinematics):
     def compute_range_of_motion(self, coordinate, return_all=False):
 
         # Verify that the coordinate exists.
-        if coordinate not in self.coordinateValues.columns:
+        if coordinate not in self._colIndex:
             raise Exception(coordinate + ' does not exist in coordinate values. Verify the name of the coordinate.')
         
-        # Compute max angle for each repetition.
-        ranges_of_motion = np.zeros((self.nRepetitions))
-        for i in range(self.nRepetitions):            
-            rep_range = self.squatEvents['eventIdxs'][i]       
-            ranges_of_motion[i] = (np.max(self.coordinateValues[coordinate].to_numpy()[rep_range[0]:rep_range[1]+1]) - 
-                                   np.min(self.coordinateValues[coordinate].to_numpy()[rep_range[0]:rep_range[1]+1]))
+        # Compute max angle for each repetition; one reduceat per extremum
+        # over the concatenated segments instead of a Python loop.
+        arr = self.coordArray()[:, self._colIndex[coordinate]]
+        flat, offsets = self._concatenate_repetitions(arr)
+        ranges_of_motion = (np.maximum.reduceat(flat, offsets) -
+                            np.minimum.reduceat(flat, offsets))
         
         # Average across all strides.
         range_of_motion_mean = np.mean(ranges_of_motion)
@@ -288,14 +429,14 @@ class squat_analysis(kinematics):
             return range_of_motion_mean, range_of_motion_std, units
 
     def compute_squat_depth(self, return_all=False):
-        pelvis_ty = self.coordinateValues['pelvis_ty'].to_numpy()  
+        pelvis_ty = self.coordArray()[:, self._colIndex['pelvis_ty']]
         
         squat_depths = np.zeros((self.nRepetitions))
         for i in range(self.nRepetitions):            
-            rep_range = self.squatEvents['eventIdxs'][i]
+            rep_range = self.squatEvents['eventIdxsExclEnd'][i]
             
-            pelvis_ty_range = pelvis_ty[rep_range[0]:rep_range[1]+1]
-            squat_depths[i] = np.max(pelvis_ty_range) - np.min(pelvis_ty_range)
+            # Peak-to-peak in one reduction instead of separate max and min.
+            squat_depths[i] = np.ptp(pelvis_ty[rep_range[0]:rep_range[1]])
         
         # Average across all squats.
         squat_depths_mean = np.mean(squat_depths)
@@ -315,10 +456,10 @@ class squat_analysis(kinematics):
         
         max_trunk_leans = np.zeros((self.nRepetitions))
         for i in range(self.nRepetitions):            
-            rep_range = self.squatEvents['eventIdxs'][i]
+            rep_range = self.squatEvents['eventIdxsExclEnd'][i]
             
-            torso_transforms_range = torso_transforms[rep_range[0]:rep_range[1]+1]
-            pelvis_transforms_range = pelvis_transforms[rep_range[0]:rep_range[1]+1]
+            torso_transforms_range = torso_transforms[rep_range[0]:rep_range[1]]
+            pelvis_transforms_range = pelvis_transforms[rep_range[0]:rep_range[1]]
             
             trunk_leans_range = np.zeros(len(torso_transforms_range))
             for j in range(len(torso_transforms_range)):
@@ -350,10 +491,10 @@ class squat_analysis(kinematics):
         
         max_trunk_leans = np.zeros((self.nRepetitions))
         for i in range(self.nRepetitions):            
-            rep_range = self.squatEvents['eventIdxs'][i]
+            rep_range = self.squatEvents['eventIdxsExclEnd'][i]
             
-            torso_transforms_range = torso_transforms[rep_range[0]:rep_range[1]+1]
-            pelvis_transforms_range = pelvis_transforms[rep_range[0]:rep_range[1]+1]
+            torso_transforms_range = torso_transforms[rep_range[0]:rep_range[1]]
+            pelvis_transforms_range = pelvis_transforms[rep_range[0]:rep_range[1]]
             
             trunk_leans_range = np.zeros(len(torso_transforms_range))
             for j in range(len(torso_transforms_range)):
@@ -394,10 +535,10 @@ class squat_analysis(kinematics):
         
         max_trunk_flexions = np.zeros((self.nRepetitions))
         for i in range(self.nRepetitions):            
-            rep_range = self.squatEvents['eventIdxs'][i]
+            rep_range = self.squatEvents['eventIdxsExclEnd'][i]
             
-            torso_transforms_range = torso_transforms[rep_range[0]:rep_range[1]+1]
-            pelvis_transforms_range = pelvis_transforms[rep_range[0]:rep_range[1]+1]
+            torso_transforms_range = torso_transforms[rep_range[0]:rep_range[1]]
+            pelvis_transforms_range = pelvis_transforms[rep_range[0]:rep_range[1]]
             
             trunk_flexions_range = np.zeros(len(torso_transforms_range))
             for j in range(len(torso_transforms_range)):
@@ -431,41 +572,69 @@ class squat_analysis(kinematics):
     def get_coordinates_segmented(self):
         
         colNames = self.coordinateValues.columns
-        data = self.coordinateValues.to_numpy(copy=True)        
+        data = self.coordArray()
         coordValuesSegmented = []
-        for eventIdx in self.squatEvents['eventIdxs']:
-            coordValuesSegmented.append(pd.DataFrame(data=data[eventIdx[0]:eventIdx[1]], columns=colNames))
+        # The frames wrap zero-copy views of the cached coordinate array; the
+        # uniform float dtype lets pandas keep them without materializing.
+        for eventIdx in self.squatEvents['eventIdxsExclEnd']:
+            coordValuesSegmented.append(pd.DataFrame(data=data[eventIdx[0]:eventIdx[1]], columns=colNames, copy=False))
         
         return coordValuesSegmented
     
+    def get_coordinates_segmented_array(self):
+
+        # Array counterpart of get_coordinates_segmented for numeric
+        # consumers: per-repetition views of the cached coordinate array,
+        # with no per-repetition DataFrame construction. Columns follow
+        # self.coordinateValues.columns.
+        data = self.coordArray()
+        return [data[eventIdx[0]:eventIdx[1]]
+                for eventIdx in self.squatEvents['eventIdxsExclEnd']]
+
     def get_center_of_mass_values_segmented(self):
 
-        data = np.vstack((self.comValues()['x'],self.comValues()['y'],self.comValues()['z'])).T        
+        data = self.comArray()
         colNames = ['com_x', 'com_y', 'com_z']        
         comValuesSegmented = []
-        for eventIdx in self.squatEvents['eventIdxs']:
-            comValuesSegmented.append(pd.DataFrame(data=data[eventIdx[0]:eventIdx[1]], columns=colNames))
+        for eventIdx in self.squatEvents['eventIdxsExclEnd']:
+            comValuesSegmented.append(pd.DataFrame(data=data[eventIdx[0]:eventIdx[1]], columns=colNames, copy=False))
         
         return comValuesSegmented
     
+    def get_center_of_mass_values_segmented_array(self):
+
+        # Array counterpart of get_center_of_mass_values_segmented; columns
+        # are x, y, z.
+        data = self.comArray()
+        return [data[eventIdx[0]:eventIdx[1]]
+                for eventIdx in self.squatEvents['eventIdxsExclEnd']]
+
     def get_coordinates_segmented_normalized_time(self):
         
         colNames = self.coordinateValues.columns
-        data = self.coordinateValues.to_numpy(copy=True)        
-        coordValuesSegmentedNorm = []
-        for eventIdx in self.squatEvents['eventIdxs']:            
-            coordValues = data[eventIdx[0]:eventIdx[1]]            
-            coordValuesSegmentedNorm.append(np.stack([np.interp(np.linspace(0,100,101),
-                                    np.linspace(0,100,len(coordValues)),coordValues[:,i]) \
-                                    for i in range(coordValues.shape[1])],axis=1))
+        data = self.coordArray()
+        # Fill one preallocated (nRepetitions, 101, nColumns) array instead of
+        # stacking per-column interpolations and re-copying the list into an
+        # ndarray for the mean/std reductions; np.interp stays the only kernel.
+        xp_norm = np.linspace(0, 100, 101)
+        # float32 halves the cube's footprint and the traffic of the mean/std
+        # reductions; kinematic angles carry far less precision than that.
+        coordValuesSegmentedNorm = np.empty(
+            (self.nRepetitions, 101, data.shape[1]), dtype=np.float32)
+        for r, eventIdx in enumerate(self.squatEvents['eventIdxsExclEnd']):
+            coordValues = data[eventIdx[0]:eventIdx[1]]
+            xp_rep = np.linspace(0, 100, len(coordValues))
+            for i in range(coordValues.shape[1]):
+                coordValuesSegmentedNorm[r, :, i] = np.interp(
+                    xp_norm, xp_rep, coordValues[:, i])
              
         coordValuesTimeNormalized = {}
         # Average.
-        coordVals_mean = np.mean(np.array(coordValuesSegmentedNorm),axis=0)
+        coordVals_mean = np.mean(coordValuesSegmentedNorm,axis=0)
         coordValuesTimeNormalized['mean'] = pd.DataFrame(data=coordVals_mean, columns=colNames)        
         # Standard deviation.
         if self.nRepetitions > 2:
-            coordVals_sd = np.std(np.array(coordValuesSegmentedNorm), axis=0)
+            coordVals_sd = np.std(coordValuesSegmentedNorm, axis=0)
             coordValuesTimeNormalized['sd'] = pd.DataFrame(data=coordVals_sd, columns=colNames)
         else:
             coordValuesTimeNormalized['sd'] = None        
@@ -476,22 +645,26 @@ class squat_analysis(kinematics):
     
     def get_center_of_mass_segmented_normalized_time(self):
         
-        data = np.vstack((self.comValues()['x'],self.comValues()['y'],self.comValues()['z'])).T        
-        colNames = ['com_x', 'com_y', 'com_z']        
-        comValuesSegmentedNorm = []
-        for eventIdx in self.squatEvents['eventIdxs']:            
-            comValues = data[eventIdx[0]:eventIdx[1]]            
-            comValuesSegmentedNorm.append(np.stack([np.interp(np.linspace(0,100,101),
-                                    np.linspace(0,100,len(comValues)),comValues[:,i]) \
-                                    for i in range(comValues.shape[1])],axis=1))
+        data = self.comArray()
+        colNames = ['com_x', 'com_y', 'com_z']
+        # Same preallocated layout as get_coordinates_segmented_normalized_time.
+        xp_norm = np.linspace(0, 100, 101)
+        comValuesSegmentedNorm = np.empty(
+            (self.nRepetitions, 101, data.shape[1]), dtype=np.float32)
+        for r, eventIdx in enumerate(self.squatEvents['eventIdxsExclEnd']):
+            comValues = data[eventIdx[0]:eventIdx[1]]
+            xp_rep = np.linspace(0, 100, len(comValues))
+            for i in range(comValues.shape[1]):
+                comValuesSegmentedNorm[r, :, i] = np.interp(
+                    xp_norm, xp_rep, comValues[:, i])
              
         comValuesTimeNormalized = {}
         # Average.
-        comValues_mean = np.mean(np.array(comValuesSegmentedNorm),axis=0)
+        comValues_mean = np.mean(comValuesSegmentedNorm,axis=0)
         comValuesTimeNormalized['mean'] = pd.DataFrame(data=comValues_mean, columns=colNames)        
         # Standard deviation.
         if self.nRepetitions > 2:
-            comValues_sd = np.std(np.array(comValuesSegmentedNorm), axis=0)
+            comValues_sd = np.std(comValuesSegmentedNorm, axis=0)
             comValuesTimeNormalized['sd'] = pd.DataFrame(data=comValues_sd, columns=colNames)
         else:
             comValuesTimeNormalized['sd'] = None        
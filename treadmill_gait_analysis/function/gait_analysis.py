@@ -22,10 +22,9 @@ import sys
 sys.path.append('../')
 
 import numpy as np
-import copy
 import pandas as pd
 from scipy.signal import find_peaks
-from matplotlib import pyplot as plt
+from functools import cached_property
 
 from utilsKinematics import kinematics
 
@@ -56,23 +55,57 @@ class gait_analysis(kinematics):
         self.markerDict = self.get_marker_dict(session_dir, trial_name, 
             lowpass_cutoff_frequency = lowpass_cutoff_frequency_for_coordinate_values)
 
-        # Coordinate values.
-        self.coordinateValues = self.get_coordinate_values()
+        # Stack the marker trajectories into one contiguous [M, T, 3]
+        # array with a name-to-row map, and rebind the marker dict to row
+        # views of it. The compute_* methods slice rows out of this store
+        # without a dict lookup, trimming below is a single O(1) slice,
+        # and the contiguous layout is friendlier to the cache.
+        self._marker_names = list(self.markerDict['markers'].keys())
+        self._marker_idx = {name: i
+                            for i, name in enumerate(self._marker_names)}
+        self._marker_arr = np.stack(
+            [self.markerDict['markers'][name]
+             for name in self._marker_names], axis=0)
+        self.markerDict['markers'] = {
+            name: self._marker_arr[i]
+            for i, name in enumerate(self._marker_names)}
+        
+        # Coordinate values. The canonical copy is a dict of numpy column
+        # views: trimming those is an O(1) slice, whereas DataFrame .iloc
+        # goes through the block manager. The DataFrame itself is rebuilt
+        # lazily for consumers that want one (see coordinateValues).
+        coordinate_values = self.get_coordinate_values()
+        self._coord_np = {col: coordinate_values[col].to_numpy()
+                          for col in coordinate_values.columns}
+        self._coordinateValues_df = None
         
         # Trim marker data and coordinate values.
         if self.trimming_start > 0:
-            self.idx_trim_start = np.where(np.round(self.markerDict['time'] - self.trimming_start,6) <= 0)[0][-1]
+            # Binary search on the sorted time vector; the 1e-6 offset keeps
+            # the rounding tolerance of the np.where(np.round(...)) approach.
+            self.idx_trim_start = np.searchsorted(
+                self.markerDict['time'], self.trimming_start + 1e-6,
+                side='right') - 1
             self.markerDict['time'] = self.markerDict['time'][self.idx_trim_start:,]
-            for marker in self.markerDict['markers']:
-                self.markerDict['markers'][marker] = self.markerDict['markers'][marker][self.idx_trim_start:,:]
-            self.coordinateValues = self.coordinateValues.iloc[self.idx_trim_start:]
+            self._marker_arr = self._marker_arr[:, self.idx_trim_start:, :]
+            self.markerDict['markers'] = {
+                name: self._marker_arr[i]
+                for i, name in enumerate(self._marker_names)}
+            self._coord_np = {col: values[self.idx_trim_start:]
+                              for col, values in self._coord_np.items()}
         
         if self.trimming_end > 0:
-            self.idx_trim_end = np.where(np.round(self.markerDict['time'],6) <= np.round(self.markerDict['time'][-1] - self.trimming_end,6))[0][-1] + 1
+            self.idx_trim_end = np.searchsorted(
+                self.markerDict['time'],
+                self.markerDict['time'][-1] - self.trimming_end + 1e-6,
+                side='right')
             self.markerDict['time'] = self.markerDict['time'][:self.idx_trim_end,]
-            for marker in self.markerDict['markers']:
-                self.markerDict['markers'][marker] = self.markerDict['markers'][marker][:self.idx_trim_end,:]
-            self.coordinateValues = self.coordinateValues.iloc[:self.idx_trim_end]
+            self._marker_arr = self._marker_arr[:, :self.idx_trim_end, :]
+            self.markerDict['markers'] = {
+                name: self._marker_arr[i]
+                for i, name in enumerate(self._marker_names)}
+            self._coord_np = {col: values[:self.idx_trim_end]
+                              for col, values in self._coord_np.items()}
         
         # Rotate marker data so x is forward (not using for now, but could be useful for some analyses).
         self.rotation_about_y, self.markerDictRotated = self.rotate_x_forward()
@@ -86,11 +119,26 @@ class gait_analysis(kinematics):
         
         # Initialize variables to be lazy loaded.
         self._comValues = None
+        self._comValuesRotatedPerGaitCycle = None
+        self._comValuesRotated = None
         self._R_world_to_gait = None
         self._leg_length = None
-
-        # Rotate marker data with a per gait cycle rotation
-        self.markerDictRotatedPerGaitCycle = self.rotate_vector_into_gait_frame()
+        
+        # Rotate marker data with a per gait cycle rotation. Only the
+        # calcaneus trajectories are read from this store downstream
+        # (stride length), so rotate just those instead of every marker.
+        self.markerDictRotatedPerGaitCycle = {
+            'markers': self.rotate_markers_into_gait_frame(
+                ['r_calc_study', 'L_calc_study'])}
+    
+    @property
+    def coordinateValues(self):
+        # DataFrame view over the trimmed coordinate columns, built on
+        # first access; the metric loops read self._coord_np directly.
+        if self._coordinateValues_df is None:
+            self._coordinateValues_df = pd.DataFrame(self._coord_np,
+                                                     copy=False)
+        return self._coordinateValues_df
     
     # Compute COM trajectory.
     def comValues(self,rotate=None,filt_freq=-1):
@@ -108,8 +156,10 @@ class gait_analysis(kinematics):
                 comUnrotated = self.comValues(filt_freq=filt_freq)
                 comRotated = self.rotate_vector_into_gait_frame(comUnrotated[['x', 'y', 'z']].to_numpy())
                 # turn back into a dataframe with time as first column
-                self._comValuesRotatedPerGaitCycle = pd.DataFrame(data=np.concatenate((np.expand_dims(comUnrotated['time'].to_numpy(), axis=1), comRotated),axis=1),
-                                           columns=['time','x','y','z'])        
+                self._comValuesRotatedPerGaitCycle = pd.DataFrame(
+                    data=np.column_stack((comUnrotated['time'].to_numpy(),
+                                          comRotated)),
+                    columns=['time','x','y','z'])        
                 if self.trimming_start > 0:
                     self._comValuesRotatedPerGaitCycle = self._comValuesRotatedPerGaitCycle.iloc[self.idx_trim_start:]            
                 if self.trimming_end > 0:
@@ -135,12 +185,80 @@ class gait_analysis(kinematics):
         
         return self.gaitEvents
     
+    def _m(self, marker_name):
+        # View of one marker's [T,3] trajectory in the stacked store.
+        return self._marker_arr[self._marker_idx[marker_name]]
+    
+    # Cached per-trial lookups. These only depend on the segmented gait
+    # events and the (already trimmed) marker data, both fixed after
+    # __init__, so resolve the dict and attribute chains once instead of
+    # on every metric call.
+    @cached_property
+    def _leg(self):
+        return self.get_leg()
+    
+    @cached_property
+    def _leg_lower(self):
+        return self.get_leg(lower=True)
+    
+    @cached_property
+    def _ankle_position_ips(self):
+        # Ipsilateral ankle joint center (midpoint of the lateral and
+        # medial ankle markers).
+        leg,_ = self._leg
+        return (self._m(leg + '_ankle_study') + 
+                self._m(leg + '_mankle_study'))/2
+    
+    @cached_property
+    def _ankle_position_cont(self):
+        # Contralateral ankle joint center.
+        _,contLeg = self._leg
+        return (self._m(contLeg + '_ankle_study') + 
+                self._m(contLeg + '_mankle_study'))/2
+    
+    @cached_property
+    def _ankle_vector(self):
+        # Vector from the contralateral to the ipsilateral ankle marker.
+        leg,contLeg = self._leg
+        return (self._m(leg + '_ankle_study') - 
+                self._m(contLeg + '_ankle_study'))
+    
+    @cached_property
+    def _calc_position_ips_rotated(self):
+        leg,_ = self._leg
+        return self.markerDictRotated['markers'][leg + '_calc_study']
+    
+    @cached_property
+    def _cycle_times(self):
+        # Stance, swing, and stride durations plus the double-support
+        # fraction, computed in one pass over the event-time arrays and
+        # shared by the timing metrics below.
+        ipsTime = self.gaitEvents['ipsilateralTime']
+        contTime = self.gaitEvents['contralateralTime']
+        stance = ipsTime[:,1] - ipsTime[:,0]
+        swing = ipsTime[:,2] - ipsTime[:,1]
+        stride = ipsTime[:,2] - ipsTime[:,0]
+        double_support = (
+            (stance - (contTime[:,1] - contTime[:,0])) / stride) * 100
+        return {'stance': stance, 'swing': swing, 'stride': stride,
+                'double_support': double_support}
+    
+    @cached_property
+    def _com_xyz(self):
+        # Stacked [T,3] COM trajectory at the default filter frequency.
+        return self.comValues()[['x','y','z']].to_numpy()
+    
+    @cached_property
+    def _calc_position_cont_rotated(self):
+        _,contLeg = self._leg
+        return self.markerDictRotated['markers'][contLeg + '_calc_study']
+    
     def rotate_x_forward(self):
         # Find the midpoint of the PSIS markers
-        psis_midpoint = (self.markerDict['markers']['r.PSIS_study'] + self.markerDict['markers']['L.PSIS_study']) / 2
+        psis_midpoint = (self._m('r.PSIS_study') + self._m('L.PSIS_study')) / 2
 
         # Find the midpoint of the ASIS markers
-        asis_midpoint = (self.markerDict['markers']['r.ASIS_study'] + self.markerDict['markers']['L.ASIS_study']) / 2
+        asis_midpoint = (self._m('r.ASIS_study') + self._m('L.ASIS_study')) / 2
 
         # Compute the vector pointing from the PSIS midpoint to the ASIS midpoint
         heading_vector = asis_midpoint - psis_midpoint
@@ -164,41 +282,32 @@ class gait_analysis(kinematics):
 
         if self._leg_length is None:
 
-            leg, contLeg = self.get_leg()
-            # compute the midpoint between the knee and m_knee markers
-            kjc = (self.markerDict['markers'][leg + '_knee_study'] + 
-                            self.markerDict['markers'][leg + '_mknee_study']) / 2
-            ajc = (self.markerDict['markers'][leg + '_ankle_study'] +
-                                self.markerDict['markers'][leg + '_mankle_study']) / 2
-            hjc = self.markerDict['markers'][leg.upper() + 'HJC_study']
-                
-            # compute the femur vector from hjc to kjc, then find the average of its norm
-            femur_vector = kjc - hjc
-            femur_length = np.mean(np.linalg.norm(femur_vector, axis=1))
+            leg, contLeg = self._leg
+            markers = self._m
 
-            # compute the tibia vector from kjc to ajc, then find the average of its norm
-            tibia_vector = ajc - kjc
-            tibia_length = np.mean(np.linalg.norm(tibia_vector, axis=1))
+            def segment_length(proximal, distal):
+                # Mean distance between two joint centers; einsum computes
+                # the squared norms without the elementwise intermediate
+                # arrays of np.linalg.norm.
+                vec = distal - proximal
+                return np.mean(np.sqrt(np.einsum('ij,ij->i', vec, vec)))
 
-            # sum the femur and tibia lengths to get the leg length
-            _leg_length = {'ipsilateral':femur_length + tibia_length}
+            self._leg_length = {}
+            for side, key in ((leg, 'ipsilateral'),
+                              (contLeg, 'contralateral')):
+                # Knee and ankle joint centers are the midpoints of the
+                # lateral and medial markers.
+                kjc = (markers(side + '_knee_study') +
+                       markers(side + '_mknee_study')) / 2
+                ajc = (markers(side + '_ankle_study') +
+                       markers(side + '_mankle_study')) / 2
+                hjc = markers(side.upper() + 'HJC_study')
 
-            # repeat for contraolateral leg
-            kjc = (self.markerDict['markers'][contLeg + '_knee_study'] + 
-                            self.markerDict['markers'][contLeg + '_mknee_study']) / 2
-            ajc = (self.markerDict['markers'][contLeg + '_ankle_study'] +
-                                self.markerDict['markers'][contLeg + '_mankle_study']) / 2
-            hjc = self.markerDict['markers'][contLeg.upper() + 'HJC_study']
-                   
-            femur_vector = kjc - hjc
-            femur_length = np.mean(np.linalg.norm(femur_vector, axis=1))
+                # Leg length is femur (hjc to kjc) plus tibia (kjc to ajc).
+                self._leg_length[key] = (segment_length(hjc, kjc) +
+                                         segment_length(kjc, ajc))
 
-            tibia_vector = ajc - kjc
-            tibia_length = np.mean(np.linalg.norm(tibia_vector, axis=1))
-
-            _leg_length['contralateral'] = femur_length + tibia_length
-        
-        return _leg_length
+        return self._leg_length
     
     
     def compute_scalars(self,scalarNames,return_all=False):
@@ -229,16 +338,19 @@ class gait_analysis(kinematics):
     
     def compute_stride_length(self,return_all=False):
         
-        leg,_ = self.get_leg()
+        leg,_ = self._leg
         
-        calc_position = self.markerDictRotatedPerGaitCycle['markers'][leg + '_calc_study']
+        calc_x = self.markerDictRotatedPerGaitCycle['markers'][
+            leg + '_calc_study'][:,0]
+        ipsIdx = self.gaitEvents['ipsilateralIdx']
+        ipsTime = self.gaitEvents['ipsilateralTime']
 
         # On treadmill, the stride length is the difference in ipsilateral
-        # calcaneus position at heel strike + treadmill speed * time.
+        # calcaneus position at heel strike + treadmill speed * time. All
+        # 1D indexing; no broadcast to (nCycles, 1) intermediates.
         strideLengths = (
-                - calc_position[self.gaitEvents['ipsilateralIdx'][:,:1],0] +
-                calc_position[self.gaitEvents['ipsilateralIdx'][:,2:3],0] + 
-                self.treadmillSpeed * np.diff(self.gaitEvents['ipsilateralTime'][:,(0,2)]))       
+                calc_x[ipsIdx[:,2]] - calc_x[ipsIdx[:,0]] + 
+                self.treadmillSpeed * (ipsTime[:,2] - ipsTime[:,0]))       
         
         # Average across all strides.
         strideLength = np.mean(strideLengths)
@@ -253,20 +365,25 @@ class gait_analysis(kinematics):
         
     
     def compute_step_length(self,return_all=False):
-        leg, contLeg = self.get_leg()
+        leg, contLeg = self._leg
         step_lengths = {}
         
+        # Forward positions and event columns as 1D arrays; the fancy
+        # indexing below then returns flat (nCycles,) vectors.
+        calc_ips_x = self._calc_position_ips_rotated[:,0]
+        calc_cont_x = self._calc_position_cont_rotated[:,0]
+        ipsIdx = self.gaitEvents['ipsilateralIdx']
+        contIdx = self.gaitEvents['contralateralIdx']
+        ipsTime = self.gaitEvents['ipsilateralTime']
+        contTime = self.gaitEvents['contralateralTime']
+        
         step_lengths[contLeg.lower()] = (
-            - self.markerDictRotated['markers'][leg + '_calc_study'][self.gaitEvents['ipsilateralIdx'][:,:1],0] + 
-            self.markerDictRotated['markers'][contLeg + '_calc_study'][self.gaitEvents['contralateralIdx'][:,1:2],0] + 
-            self.treadmillSpeed * (self.gaitEvents['contralateralTime'][:,1:2] -
-                                   self.gaitEvents['ipsilateralTime'][:,:1]))
+            calc_cont_x[contIdx[:,1]] - calc_ips_x[ipsIdx[:,0]] + 
+            self.treadmillSpeed * (contTime[:,1] - ipsTime[:,0]))
         
         step_lengths[leg.lower()]  = (
-            self.markerDictRotated['markers'][leg + '_calc_study'][self.gaitEvents['ipsilateralIdx'][:,2:],0] - 
-            self.markerDictRotated['markers'][contLeg + '_calc_study'][self.gaitEvents['contralateralIdx'][:,1:2],0] + 
-            self.treadmillSpeed * (-self.gaitEvents['contralateralTime'][:,1:2] +
-                                   self.gaitEvents['ipsilateralTime'][:,2:]))
+            calc_ips_x[ipsIdx[:,2]] - calc_cont_x[contIdx[:,1]] + 
+            self.treadmillSpeed * (ipsTime[:,2] - contTime[:,1]))
                
         # Average across all strides.
         step_length = {key: np.mean(values) for key, values in step_lengths.items()}
@@ -300,7 +417,7 @@ class gait_analysis(kinematics):
     
     def compute_gait_speed(self,return_all=False):
                            
-        comValuesArray = np.vstack((self.comValues()['x'],self.comValues()['y'],self.comValues()['z'])).T
+        comValuesArray = self._com_xyz
         gait_speeds = (
             np.linalg.norm(
                 comValuesArray[self.gaitEvents['ipsilateralIdx'][:,:1]] -
@@ -321,7 +438,7 @@ class gait_analysis(kinematics):
     def compute_cadence(self,return_all=False):
         
         # In steps per minute.
-        cadence_all = 60*2/np.diff(self.gaitEvents['ipsilateralTime'][:,(0,2)])
+        cadence_all = 60*2/self._cycle_times['stride']
         
         # Average across all strides.
         cadence = np.mean(cadence_all)
@@ -339,20 +456,22 @@ class gait_analysis(kinematics):
         
         # Heuristic to determine if overground or treadmill.
         if gait_style == 'auto' or gait_style == 'treadmill':
-            leg,_ = self.get_leg()
+            leg,_ = self._leg
             
-            foot_position = self.markerDict['markers'][leg + '_ankle_study']
+            foot_position = self._m(leg + '_ankle_study')
             
             stanceTimeLength = np.round(np.diff(self.gaitEvents['ipsilateralIdx'][:,:2]))
             startIdx = np.round(self.gaitEvents['ipsilateralIdx'][:,:1]+.1*stanceTimeLength).astype(int)
             endIdx = np.round(self.gaitEvents['ipsilateralIdx'][:,1:2]-.3*stanceTimeLength).astype(int)
                 
-            # Average instantaneous velocities.
-            dt = np.diff(self.markerDict['time'][:2])[0]
-            treadmillSpeeds = np.zeros((self.nGaitCycles,))
-            for i in range(self.nGaitCycles):
-                treadmillSpeeds[i,] = np.linalg.norm(np.mean(np.diff(
-                    foot_position[startIdx[i,0]:endIdx[i,0],:],axis=0),axis=0)/dt)
+            # Average instantaneous velocities. Differentiate the whole
+            # trajectory once and mean each cycle's window with reduceat;
+            # the diffs of window [start, end) are vel[start:end-1].
+            dt = self.markerDict['time'][1] - self.markerDict['time'][0]
+            vel = np.diff(foot_position, axis=0) / dt
+            treadmillSpeeds = np.linalg.norm(
+                self._interval_means(vel, startIdx[:,0], endIdx[:,0] - 1),
+                axis=1)
             
             treadmillSpeed = np.mean(treadmillSpeeds)
             
@@ -374,48 +493,52 @@ class gait_analysis(kinematics):
         else:
             return treadmillSpeed, units
     
+    @staticmethod
+    def _interval_means(positions, starts, ends):
+        # Per-interval means of positions[starts[i]:ends[i]] in one C-level
+        # pass: interleave the bounds and let add.reduceat sum each window.
+        idx = np.empty(2 * len(starts), dtype=np.intp)
+        idx[0::2] = starts
+        idx[1::2] = ends
+        sums = np.add.reduceat(positions, idx, axis=0)[0::2]
+        return sums / (ends - starts)[:, np.newaxis]
+
     def compute_step_width(self,return_all=False):
         
-        leg,contLeg = self.get_leg()
-        
         # Get ankle joint center positions.
-        ankle_position_ips = (
-            self.markerDict['markers'][leg + '_ankle_study'] + 
-            self.markerDict['markers'][leg + '_mankle_study'])/2
-        ankle_position_cont = (
-            self.markerDict['markers'][contLeg + '_ankle_study'] + 
-            self.markerDict['markers'][contLeg + '_mankle_study'])/2        
+        ankle_position_ips = self._ankle_position_ips
+        ankle_position_cont = self._ankle_position_cont
+        
+        ipsIdx = self.gaitEvents['ipsilateralIdx']
+        contIdx = self.gaitEvents['contralateralIdx']
         
         # Find indices of 40-60% of the stance phase
-        ips_stance_length = np.diff(self.gaitEvents['ipsilateralIdx'][:,(0,1)])
-        cont_stance_length = (self.gaitEvents['contralateralIdx'][:,0] - 
-                              self.gaitEvents['ipsilateralIdx'][:,0] +
-                              self.gaitEvents['ipsilateralIdx'][:,2]-
-                              self.gaitEvents['contralateralIdx'][:,1])
-        
-        midstanceIdx_ips = [range(self.gaitEvents['ipsilateralIdx'][i,0] + 
-                                  int(np.round(.4*ips_stance_length[i])),
-                                  self.gaitEvents['ipsilateralIdx'][i,0] + 
-                                  int(np.round(.6*ips_stance_length[i]))) 
-                                  for i in range(self.nGaitCycles)]
-        
-        midstanceIdx_cont = [range(np.min((self.gaitEvents['contralateralIdx'][i,1] + 
-                                  int(np.round(.4*cont_stance_length[i])),
-                                  self.gaitEvents['ipsilateralIdx'][i,2]-1)),
-                                  np.min((self.gaitEvents['contralateralIdx'][i,1] + 
-                                  int(np.round(.6*cont_stance_length[i])),
-                                  self.gaitEvents['ipsilateralIdx'][i,2]))) 
-                                  for i in range(self.nGaitCycles)]   
-        
-        ankleVector = np.zeros((self.nGaitCycles,3))
-        for i in range(self.nGaitCycles):
-            ankleVector[i,:] = (
-                np.mean(ankle_position_cont[midstanceIdx_cont[i],:],axis=0) - 
-                np.mean(ankle_position_ips[midstanceIdx_ips[i],:],axis=0))
-                     
-        ankleVector_inGaitFrame = np.array(
-            [np.dot(ankleVector[i,:], self.R_world_to_gait()[i,:,:]) 
-            for i in range(self.nGaitCycles)])
+        ips_stance_length = (ipsIdx[:,1] - ipsIdx[:,0])
+        cont_stance_length = (contIdx[:,0] - ipsIdx[:,0] +
+                              ipsIdx[:,2] - contIdx[:,1])
+        
+        midstance_start_ips = ipsIdx[:,0] + np.round(
+            .4*ips_stance_length).astype(np.intp)
+        midstance_end_ips = ipsIdx[:,0] + np.round(
+            .6*ips_stance_length).astype(np.intp)
+        
+        midstance_start_cont = np.minimum(
+            contIdx[:,1] + np.round(.4*cont_stance_length).astype(np.intp),
+            ipsIdx[:,2] - 1)
+        midstance_end_cont = np.minimum(
+            contIdx[:,1] + np.round(.6*cont_stance_length).astype(np.intp),
+            ipsIdx[:,2])
+        
+        # Mean ankle positions over the midstance windows, all cycles at once.
+        ankleVector = (
+            self._interval_means(
+                ankle_position_cont, midstance_start_cont, midstance_end_cont) -
+            self._interval_means(
+                ankle_position_ips, midstance_start_ips, midstance_end_ips))
+        
+        # Rotate every cycle's vector into its gait frame in one contraction.
+        ankleVector_inGaitFrame = np.einsum(
+            'ij,ijk->ik', ankleVector, self.R_world_to_gait())
         
         # Step width is z distance.
         stepWidths = np.abs(ankleVector_inGaitFrame[:,2])
@@ -433,7 +556,7 @@ class gait_analysis(kinematics):
     
     def compute_stance_time(self, return_all=False):
         
-        stanceTimes = np.diff(self.gaitEvents['ipsilateralTime'][:,:2])
+        stanceTimes = self._cycle_times['stance']
         
         # Average across all strides.
         stanceTime = np.mean(stanceTimes)
@@ -448,7 +571,7 @@ class gait_analysis(kinematics):
     
     def compute_swing_time(self, return_all=False):
         
-        swingTimes = np.diff(self.gaitEvents['ipsilateralTime'][:,1:])
+        swingTimes = self._cycle_times['swing']
         
         # Average across all strides.
         swingTime = np.mean(swingTimes)
@@ -481,10 +604,7 @@ class gait_analysis(kinematics):
     def compute_double_support_time(self,return_all=False):
         
         # Ipsilateral stance time - contralateral swing time.
-        doubleSupportTimes = (
-            (np.diff(self.gaitEvents['ipsilateralTime'][:,:2]) - 
-            np.diff(self.gaitEvents['contralateralTime'][:,:2])) /
-            np.diff(self.gaitEvents['ipsilateralTime'][:,(0,2)])) * 100
+        doubleSupportTimes = self._cycle_times['double_support']
                             
         # Average across all strides.
         doubleSupportTime = np.mean(doubleSupportTimes)
@@ -503,22 +623,21 @@ class gait_analysis(kinematics):
         hs_2_idx = self.gaitEvents['ipsilateralIdx'][:,2]
         
         # ankle markers
-        leg,contLeg = self.get_leg()
-        ankleVector = (self.markerDict['markers'][leg + '_ankle_study'] - 
-                       self.markerDict['markers'][contLeg + '_ankle_study'])
-        ankleVector_inGaitFrame = np.array(
-            [np.dot(ankleVector, self.R_world_to_gait()[i,:,:]) 
-              for i in range(self.nGaitCycles)])                                          
+        R = self.R_world_to_gait()
+        ankleVector = self._ankle_vector
+        ankle_angle = self._coord_np[
+            'ankle_angle_' + self.gaitEvents['ipsilateralLeg']]
         
         swingDfAngles = np.zeros((to_1_idx.shape))
         
         for i in range(self.nGaitCycles):
+            # Rotate only this cycle's swing-phase slice into its gait frame
+            # instead of the full trajectory for every cycle.
+            ankleVector_inGaitFrame = ankleVector[to_1_idx[i]:hs_2_idx[i]] @ R[i]
             # find index within a swing phase with the smallest z distance between ankles
-            idx_midSwing = np.argmin(np.abs(ankleVector_inGaitFrame[
-                                     i,to_1_idx[i]:hs_2_idx[i],0]))+to_1_idx[i]
+            idx_midSwing = np.argmin(np.abs(ankleVector_inGaitFrame[:,0]))+to_1_idx[i]
             
-            swingDfAngles[i] = np.mean(self.coordinateValues['ankle_angle_' + 
-                                self.gaitEvents['ipsilateralLeg']].to_numpy()[idx_midSwing])          
+            swingDfAngles[i] = ankle_angle[idx_midSwing]          
         
         # Average across all strides.
         swingDfAngle = np.mean(swingDfAngles)
@@ -538,21 +657,18 @@ class gait_analysis(kinematics):
         hs_2_idx = self.gaitEvents['ipsilateralIdx'][:,2]
         
         # ankle markers
-        leg,contLeg = self.get_leg()
-        ankleVector = (self.markerDict['markers'][leg + '_ankle_study'] - 
-                       self.markerDict['markers'][contLeg + '_ankle_study'])
-        ankleVector_inGaitFrame = np.array(
-            [np.dot(ankleVector, self.R_world_to_gait()[i,:,:]) 
-              for i in range(self.nGaitCycles)])                                          
+        R = self.R_world_to_gait()
+        ankleVector = self._ankle_vector
         
         swingAnkleHeighDiffs = np.zeros((to_1_idx.shape))
         
         for i in range(self.nGaitCycles):
+            # Rotate only this cycle's swing-phase slice into its gait frame.
+            ankleVector_inGaitFrame = ankleVector[to_1_idx[i]:hs_2_idx[i]] @ R[i]
             # find index within a swing phase with the smallest z distance between ankles
-            idx_midSwing = np.argmin(np.abs(ankleVector_inGaitFrame[
-                                     i,to_1_idx[i]:hs_2_idx[i],0]))+to_1_idx[i]
+            idx_midSwing = np.argmin(np.abs(ankleVector_inGaitFrame[:,0]))
             
-            swingAnkleHeighDiffs[i] = ankleVector_inGaitFrame[i,idx_midSwing,1]  
+            swingAnkleHeighDiffs[i] = ankleVector_inGaitFrame[idx_midSwing,1]  
         
         # Average across all strides.
         swingAnkleHeighDiff = np.mean(swingAnkleHeighDiffs)
@@ -568,11 +684,14 @@ class gait_analysis(kinematics):
     def compute_peak_angle(self,dof,start_idx,end_idx,return_all=False):
         # start_idx and end_idx are 1xnGaitCycles        
         
-        peakAngles = np.zeros((self.nGaitCycles))
+        angles = self._coord_np[dof + '_' + self.gaitEvents['ipsilateralLeg']]
         
-        for i in range(self.nGaitCycles):                       
-            peakAngles[i] = np.max(self.coordinateValues[dof + '_' +
-                                self.gaitEvents['ipsilateralLeg']][start_idx[i]:end_idx[i]])
+        # Alternating [start, end) bounds; the even slots of the reduceat
+        # output hold the per-cycle maxima, computed in one C-level pass.
+        bounds = np.stack((np.asarray(start_idx, dtype=np.intp),
+                           np.asarray(end_idx, dtype=np.intp)),
+                          axis=1).ravel()
+        peakAngles = np.maximum.reduceat(angles, bounds)[0::2]
         
         # Average across all strides.
         peakAngle = np.mean(peakAngles)
@@ -588,11 +707,14 @@ class gait_analysis(kinematics):
     def compute_rom(self,dof,start_idx,end_idx,return_all=False):
         # start_idx and end_idx are 1xnGaitCycles        
         
-        roms = np.zeros((self.nGaitCycles))
+        angles = self._coord_np[dof + '_' + self.gaitEvents['ipsilateralLeg']]
         
-        for i in range(self.nGaitCycles):                       
-            roms[i] = np.ptp(self.coordinateValues[dof + '_' +
-                                self.gaitEvents['ipsilateralLeg']][start_idx[i]:end_idx[i]])
+        # Per-cycle max minus min over the same alternating bounds.
+        bounds = np.stack((np.asarray(start_idx, dtype=np.intp),
+                           np.asarray(end_idx, dtype=np.intp)),
+                          axis=1).ravel()
+        roms = (np.maximum.reduceat(angles, bounds)[0::2] -
+                np.minimum.reduceat(angles, bounds)[0::2])
         
         # Average across all strides.
         rom = np.mean(roms)
@@ -611,78 +733,72 @@ class gait_analysis(kinematics):
         # the weighting is based on mean absolute percent error. In effect,
         # this penalizes both shape and magnitude differences.
         
-        leg,contLeg = self.get_leg(lower=True)
-               
+        leg,contLeg = self._leg_lower
+        
+        # Pair each ipsilateral column with its contralateral counterpart
+        # once, rather than re-matching column names per gait cycle.
+        col_pairs = []
+        for col in self._coord_np:
+            if col.endswith('_' + leg):
+                corresponding_col = col[:-1] + contLeg
+                if corresponding_col in self._coord_np and (
+                        cols_to_compare is None or
+                        any(col.startswith(col_compare)
+                            for col_compare in cols_to_compare)):
+                    col_pairs.append((col, corresponding_col))
+        
+        ipsIdx = self.gaitEvents['ipsilateralIdx']
+        contIdx = self.gaitEvents['contralateralIdx']
+        
         correlations_all_cycles = []
         mean_correlation_all_cycles = np.zeros((self.nGaitCycles,1))
         
         for i in range(self.nGaitCycles):
-
             
-            hs_ind_1 = self.gaitEvents['ipsilateralIdx'][i,0]
-            hs_ind_cont = self.gaitEvents['contralateralIdx'][i,1]
-            hs_ind_2 = self.gaitEvents['ipsilateralIdx'][i,2]
+            hs_ind_1 = ipsIdx[i,0]
+            hs_ind_cont = contIdx[i,1]
+            hs_ind_2 = ipsIdx[i,2]
             
-            df1 = pd.DataFrame()
-            df2 = pd.DataFrame()
+            # [nFrames, nPairs] arrays for both sides; the contralateral
+            # signals are rolled so both start at their own heel strike.
+            signals1 = np.column_stack(
+                [self._coord_np[col1][hs_ind_1:hs_ind_2]
+                 for col1,_ in col_pairs])
+            signals2 = np.column_stack(
+                [np.concatenate((self._coord_np[col2][hs_ind_cont:hs_ind_2],
+                                 self._coord_np[col2][hs_ind_1:hs_ind_cont]))
+                 for _,col2 in col_pairs])
             
-            if cols_to_compare is None:
-                cols_to_compare = df1.columns
+            # Pearson correlation for every pair at once.
+            signals1_c = signals1 - signals1.mean(axis=0)
+            signals2_c = signals2 - signals2.mean(axis=0)
+            correlation = (
+                (signals1_c * signals2_c).sum(axis=0) /
+                np.sqrt((signals1_c**2).sum(axis=0) *
+                        (signals2_c**2).sum(axis=0)))
             
-            # create a dataframe of coords for this gait cycle
-            for col in self.coordinateValues.columns:
-                if col.endswith('_' + leg):
-                    df1[col] = self.coordinateValues[col][hs_ind_1:hs_ind_2]
-                elif col.endswith('_' + contLeg):
-                    df2[col] = np.concatenate((self.coordinateValues[col][hs_ind_cont:hs_ind_2],
-                                               self.coordinateValues[col][hs_ind_1:hs_ind_cont]))
-            df1 = df1.reset_index(drop=True)
-            df2 = df2.reset_index(drop=True)
-                    
-            # Interpolating both dataframes to have 101 rows for each column
-            df1_interpolated = df1.interpolate(method='linear', limit_direction='both', limit_area='inside', limit=100)
-            df2_interpolated = df2.interpolate(method='linear', limit_direction='both', limit_area='inside', limit=100)
-        
-            # Computing the correlation between appropriate columns in both dataframes
-            correlations = {}
-            total_weighted_correlation = 0
-            # total_weight = 0
-        
-            for col1 in df1_interpolated.columns:
-                if any(col1.startswith(col_compare) for col_compare in cols_to_compare):
-                    if col1.endswith('_r'):   
-                        corresponding_col = col1[:-2] + '_l'
-                    elif col1.endswith('_l'):
-                        corresponding_col = col1[:-2] + '_r'
-                            
-                    if corresponding_col in df2_interpolated.columns:
-                        signal1 = df1_interpolated[col1]
-                        signal2 = df2_interpolated[corresponding_col]
-        
-                        max_range_signal1 = np.ptp(signal1)
-                        max_range_signal2 = np.ptp(signal2)
-                        max_range = max(max_range_signal1, max_range_signal2)
-        
-                        mean_abs_error = np.mean(np.abs(signal1 - signal2)) / max_range
-        
-                        correlation = signal1.corr(signal2)
-                        weight = 1 - mean_abs_error
-        
-                        weighted_correlation = correlation * weight
-                        correlations[col1] = weighted_correlation
-        
-                        total_weighted_correlation += weighted_correlation
-        
-                        # Plotting the signals if visualize is True
-                        if visualize:
-                            plt.figure(figsize=(8, 5))
-                            plt.plot(signal1, label='df1')
-                            plt.plot(signal2, label='df2')
-                            plt.title(f"Comparison between {col1} and {corresponding_col} with weighted correlation {weighted_correlation}")
-                            plt.legend()
-                            plt.show()
-        
-            mean_correlation_all_cycles[i] = total_weighted_correlation / len(correlations)
+            # Weight by 1 - normalized mean absolute error.
+            max_range = np.maximum(np.ptp(signals1,axis=0),
+                                   np.ptp(signals2,axis=0))
+            mean_abs_error = np.mean(np.abs(signals1 - signals2),
+                                     axis=0) / max_range
+            weighted_correlation = correlation * (1 - mean_abs_error)
+            
+            correlations = {col1: weighted_correlation[j]
+                            for j,(col1,_) in enumerate(col_pairs)}
+            
+            # Plotting the signals if visualize is True
+            if visualize:
+                import matplotlib.pyplot as plt
+                for j,(col1,corresponding_col) in enumerate(col_pairs):
+                    plt.figure(figsize=(8, 5))
+                    plt.plot(signals1[:,j], label='df1')
+                    plt.plot(signals2[:,j], label='df2')
+                    plt.title(f"Comparison between {col1} and {corresponding_col} with weighted correlation {weighted_correlation[j]}")
+                    plt.legend()
+                    plt.show()
+        
+            mean_correlation_all_cycles[i] = np.mean(weighted_correlation)
             correlations_all_cycles.append(correlations)
             
         if not return_all:
@@ -699,17 +815,17 @@ class gait_analysis(kinematics):
         
         # Pelvis center trajectory (for overground heading vector).
         pelvisMarkerNames = ['r.ASIS_study','L.ASIS_study','r.PSIS_study','L.PSIS_study']
-        pelvisMarkers = [self.markerDict['markers'][mkr]  for mkr in pelvisMarkerNames]
+        pelvisMarkers = [self._m(mkr)  for mkr in pelvisMarkerNames]
         pelvisCenter = np.mean(np.array(pelvisMarkers),axis=0)
         
         # Ankle trajectory (for treadmill heading vector).
         leg = self.gaitEvents['ipsilateralLeg']
         if leg == 'l': leg='L'
-        anklePos = self.markerDict['markers'][leg + '_ankle_study']
+        anklePos = self._m(leg + '_ankle_study')
         
         # Vector from left ASIS to right ASIS (for mediolateral direction).
         asisMarkerNames = ['L.ASIS_study','r.ASIS_study']
-        asisMarkers = [self.markerDict['markers'][mkr]  for mkr in asisMarkerNames]
+        asisMarkers = [self._m(mkr)  for mkr in asisMarkerNames]
         asisVector = np.squeeze(np.diff(np.array(asisMarkers),axis=0))
         
         # Heading vector per gait cycle.
@@ -718,17 +834,14 @@ class gait_analysis(kinematics):
             x = np.diff(pelvisCenter[self.gaitEvents['ipsilateralIdx'][:,(0,2)],:],axis=1)[:,0,:]
             x = x / np.linalg.norm(x,axis=1,keepdims=True)
         else: 
-            x = np.zeros((self.nGaitCycles,3))
-            for i in range(self.nGaitCycles):
-                x[i,:] = anklePos[self.gaitEvents['ipsilateralIdx'][i,2]] - \
-                         anklePos[self.gaitEvents['ipsilateralIdx'][i,1]]
+            x = (anklePos[self.gaitEvents['ipsilateralIdx'][:,2]] - 
+                 anklePos[self.gaitEvents['ipsilateralIdx'][:,1]])
             x = x / np.linalg.norm(x,axis=1,keepdims=True)
             
-        # Mean ASIS vector over gait cycle.
-        z_temp = np.zeros((self.nGaitCycles,3))
-        for i in range(self.nGaitCycles):
-            z_temp[i,:] = np.mean(asisVector[self.gaitEvents['ipsilateralIdx'][i,0]: \
-                             self.gaitEvents['ipsilateralIdx'][i,2]],axis=0)
+        # Mean ASIS vector over gait cycle, all cycles in one pass.
+        z_temp = self._interval_means(asisVector,
+                                      self.gaitEvents['ipsilateralIdx'][:,0],
+                                      self.gaitEvents['ipsilateralIdx'][:,2])
         z_temp = z_temp / np.linalg.norm(z_temp,axis=1,keepdims=True)
         
         # Cross to get y.
@@ -741,6 +854,20 @@ class gait_analysis(kinematics):
         
         return R_lab_to_gait
     
+    def rotate_markers_into_gait_frame(self, marker_names):
+        # Per-gait-cycle rotation of a subset of markers; same caveats as
+        # rotate_vector_into_gait_frame below.
+        ipsIdx = self.gaitEvents['ipsilateralIdx']
+        R = self.R_world_to_gait()
+        rotated = {}
+        for name in marker_names:
+            marker = self._m(name).copy()
+            for i in range(self.nGaitCycles):
+                marker[ipsIdx[i,0]:ipsIdx[i,2],:] = (
+                    marker[ipsIdx[i,0]:ipsIdx[i,2],:] @ R[i])
+            rotated[name] = marker
+        return rotated
+    
     def rotate_vector_into_gait_frame(self,vectorArray=None):
         # vectorArray is a nFramesx3 array
         # This takes a vector array and rotates it into the gait frame, per gait frame. Thus,
@@ -753,7 +880,12 @@ class gait_analysis(kinematics):
             return np.dot(vec,R)
         
         if vectorArray is None: # rotate each marker in the entire markerDict
-            markerDict_rotated_per_step = copy.deepcopy(self.markerDict)
+            # Shallow-copy the dict and copy only the marker arrays that
+            # get rotated in place below.
+            markerDict_rotated_per_step = dict(self.markerDict)
+            markerDict_rotated_per_step['markers'] = {
+                name: marker.copy()
+                for name, marker in self.markerDict['markers'].items()}
             for marker_name,marker in markerDict_rotated_per_step['markers'].items():
                 for i in range(self.nGaitCycles):
                     markerDict_rotated_per_step['markers'][marker_name][self.gaitEvents['ipsilateralIdx'][i,0]:
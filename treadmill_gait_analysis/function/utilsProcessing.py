@@ -24,15 +24,24 @@ pathFile = os.path.dirname(os.path.realpath(__file__))
 import logging
 import opensim
 import numpy as np
+from functools import lru_cache
 from scipy import signal
 import matplotlib.pyplot as plt
 from utils import storage_to_dataframe, download_trial, get_trial_id
 
+@lru_cache(maxsize=8)
+def _butter_lowpass_sos(order, wn):
+    # Cache the filter design: the kinematics getters refilter different
+    # signals at the same cutoff and sampling frequency over and over.
+    return signal.butter(order/2, wn, btype='low', output='sos')
+
 def lowPassFilter(time, data, lowpass_cutoff_frequency, order=4):
     
     fs = 1/np.round(np.mean(np.diff(time)),16)
     wn = lowpass_cutoff_frequency/(fs/2)
-    sos = signal.butter(order/2, wn, btype='low', output='sos')
+    sos = _butter_lowpass_sos(order, wn)
+    # sosfiltfilt odd-reflects the signal at both ends before the
+    # forward-backward pass, which suppresses edge artifacts.
     dataFilt = signal.sosfiltfilt(sos, data, axis=0)
 
     return dataFilt
@@ -82,10 +91,12 @@ def segment_squats(ikFilePath, pelvis_ty=None, timeVec=None, visualize=False,
             nextIdx = idxMinPelvTy[i+1]
         else:
             nextIdx = len(pelvSignalPos)
-        startIdx = np.argmax(pelvSignalPos[minIdxOld:minIdx]) + minIdxOld
-        endIdx = np.argmax(pelvSignalPos[minIdx:nextIdx]) + minIdx
+        startIdx = int(np.argmax(pelvSignalPos[minIdxOld:minIdx])) + minIdxOld
+        endIdx = int(np.argmax(pelvSignalPos[minIdx:nextIdx])) + minIdx
         startFinishInds.append([startIdx,endIdx])
-        minIdxOld = np.copy(minIdx)
+        # Plain int assignment; copying the 0-d index array allocates an
+        # ndarray per minimum for no benefit.
+        minIdxOld = int(minIdx)
     startFinishTimes = [timeVec[i].tolist() for i in startFinishInds]
     
     if visualize:
@@ -157,7 +168,7 @@ def segment_STS(ikFilePath, pelvis_ty=None, timeVec=None, velSeated=0.3,
         slowingIndRight = np.argwhere(velsRightOfPeak<velStanding)[0]
         endIdx = velPeak + slowingIndRight
         startFinishInds.append([startIdx[0],endIdx[0]])
-        maxIdxOld = np.copy(maxIdx)
+        maxIdxOld = int(maxIdx)
     risingTimes = [timeVec[i].tolist() for i in startFinishInds]  
         
     # We add a delay to make sure we do not simulate part of the motion